@@ -0,0 +1,58 @@
+'''
+Rate-limit governor priority check.
+
+Queues `--background` background requests on one method, then issues an interactive request for the same method
+`--after` milliseconds later, as when a foreground lookup lands in the middle of a burst of cache revalidations. Only
+the governor is exercised (grants, no HTTP), with the method limited to `--limit` and a roomy app bucket.
+
+Reports how long the interactive request waited and how many background requests were granted before it.
+`--reserve 0` shows the behavior without a background reserve on method buckets.
+
+Usage (from the repository root):
+    python -m bench.governor_priority --limit 10:1 --background 30
+'''
+import time
+import asyncio
+import argparse
+
+import modules.riot_client as riot_client
+from modules.riot_client import Governor, INTERACTIVE, BACKGROUND
+
+METHOD = "/lol/league/v4/entries/by-summoner/{id}"
+
+async def run(args: argparse.Namespace):
+    governor = Governor()
+    governor.app.set_limits("1000:1")
+    governor.method(METHOD).set_limits(args.limit)
+
+    granted = []
+
+    async def request(priority: int):
+        await governor.acquire(METHOD, priority)
+        granted.append(priority)
+
+    start = time.perf_counter()
+    background = [asyncio.create_task(request(BACKGROUND)) for _ in range(args.background)]
+
+    await asyncio.sleep(args.after / 1000)
+    t = time.perf_counter()
+    await request(INTERACTIVE)
+    wait = time.perf_counter() - t
+    ahead = granted.index(INTERACTIVE)
+
+    await asyncio.gather(*background)
+
+    print(f"method limit:     {args.limit} | background reserve {riot_client.BACKGROUND_RESERVE:.0%}")
+    print(f"interactive wait: {wait * 1000:.1f} ms ({ahead} background requests granted before it)")
+    print(f"all granted in:   {time.perf_counter() - start:.2f}s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rate-limit governor priority check.")
+    parser.add_argument("--limit", default="10:1", help="method rate limit, e.g. 10:1")
+    parser.add_argument("--background", type=int, default=30, help="background requests queued first")
+    parser.add_argument("--after", type=float, default=50, help="milliseconds before the interactive request")
+    parser.add_argument("--reserve", type=float, default=riot_client.BACKGROUND_RESERVE, help="share of every window kept from background requests")
+    args = parser.parse_args()
+
+    riot_client.BACKGROUND_RESERVE = args.reserve
+    asyncio.run(run(args))
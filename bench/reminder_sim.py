@@ -0,0 +1,230 @@
+'''
+Reminder scheduler simulation and load benchmark.
+
+Seeds a throwaway reminder database with N users x M reminders, loads it through `ReminderCog`, then fast-forwards a
+virtual clock from one due time to the next, delivering through a stub Discord user/DM channel.
+
+Reports cold load time, delivery lag percentiles, CPU time per tick, bytes written and peak memory.\n
+With `--instances K`, K cogs share the database through leases and duplicate deliveries are counted. Each tick the
+instances claim `--claim-limit` rows at a time in turn (starting with a different instance every tick), the way
+separate processes racing for the same due rows would.
+
+Usage (from the repository root):
+    python -m bench.reminder_sim --users 1000 --reminders 100
+'''
+import os
+import time
+import random
+import asyncio
+import argparse
+import datetime
+import resource
+import tempfile
+from collections import deque
+
+import discord
+
+import cogs.reminder as reminder_cog
+import modules.reminder_delivery as reminder_delivery
+import modules.reminder_scheduler as reminder_scheduler
+from modules.reminder_store import ReminderStore, INSERT, to_row
+
+class VirtualClock():
+    '''
+    Wall clock that can be fast-forwarded. Real time keeps flowing between jumps, so processing delays show up as lag.
+    '''
+    def __init__(self):
+        self.offset = time.time() - time.perf_counter()
+
+    def time(self) -> float:
+        return self.offset + time.perf_counter()
+
+    def jump(self, when: float):
+        if (delta := when - self.time()) > 0:
+            self.offset += delta
+
+class StubResponse():
+    status = 503
+    reason = "Service Unavailable"
+
+class StubChannel():
+    def __init__(self, sim):
+        self.sim = sim
+
+    async def send(self, **kwargs):
+        if self.sim.latency:
+            await asyncio.sleep(self.sim.latency)
+
+        if self.sim.failures and random.random() < self.sim.failures:
+            raise discord.HTTPException(StubResponse(), "stub failure")
+
+        self.sim.messages += 1
+
+class StubUser():
+    def __init__(self, id: int, channel: StubChannel):
+        self.id = id
+        self.display_name = str(id)
+        self.display_avatar = "https://cdn.discordapp.com/embed/avatars/0.png"
+        self.dm_channel = channel
+
+class StubBot():
+    '''
+    Just enough of `commands.Bot` for `ReminderCog`: users come from an in-memory table, the bot is never ready.
+    '''
+    def __init__(self, sim):
+        self.channel = StubChannel(sim)
+        self.users = {}
+        self.ready = asyncio.Event()
+
+    def get_user(self, id: int):
+        if not (user := self.users.get(id)):
+            user = self.users[id] = StubUser(id, self.channel)
+        return user
+
+    async def fetch_user(self, id: int):
+        return self.get_user(id)
+
+    async def wait_until_ready(self):
+        await self.ready.wait()
+
+class Simulation():
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.latency = args.send_latency / 1000
+        self.failures = args.failures
+        self.messages = 0
+
+    def seed(self, path: str, start: float):
+        '''
+        Bulk-writes N users x M reminders due within the horizon (a share of them due in the same minute).
+        '''
+        created = datetime.datetime.fromtimestamp(start).astimezone()
+        burst = start + self.args.horizon / 2
+
+        store = ReminderStore(path)
+        for user in range(self.args.users):
+            rows = []
+            for _ in range(self.args.reminders):
+                due = burst + random.uniform(0, 60) if random.random() < self.args.burst else start + random.uniform(1, self.args.horizon)
+                reminder = {'time': datetime.datetime.fromtimestamp(due).astimezone(), 'task': "drink water",
+                            'url': "https://discord.com/channels/1/2/3", 'created': created, 'modified': created}
+                rows.append(to_row(10**17 + user, reminder))
+            with store.conn:
+                store.conn.executemany(INSERT, rows)
+        store.close()
+
+    async def run(self):
+        args = self.args
+        clock = VirtualClock()
+        start = clock.time()
+        reminder_delivery.BACKOFF = 0.01
+        reminder_scheduler.CLAIM_LIMIT = args.claim_limit
+
+        with tempfile.TemporaryDirectory() as directory:
+            reminder_cog.DB_PATH = os.path.join(directory, "reminders.db")
+            reminder_cog.JSON_PATH = os.path.join(directory, "reminders.json")
+
+            t = time.perf_counter()
+            self.seed(reminder_cog.DB_PATH, start)
+            print(f"seeded {args.users * args.reminders} reminders in {time.perf_counter() - t:.2f}s")
+
+            # cold load, instances after the first share the database through leases
+            t = time.perf_counter()
+            cogs = []
+            for i in range(args.instances):
+                if args.instances > 1:
+                    os.environ["REMINDER_INSTANCE"] = f"sim-{i}"
+                cogs.append(reminder_cog.ReminderCog(StubBot(self)))
+            os.environ.pop("REMINDER_INSTANCE", None)
+            load = time.perf_counter() - t
+
+            delivered = {}
+            for cog in cogs:
+                cog.scheduler.clock = clock.time
+                cog.delivery.clock = clock.time
+                cog.delivery.latency = deque()
+                cog.delivery.done = self.recorder(cog.delivery.done, delivered)
+                cog.delivery.start()
+
+            written = io_written()
+            ticks = []
+            end = start + args.horizon
+
+            # fast-forward from one due time (or fixed tick) to the next
+            while (head := cogs[0].scheduler.peek()) != None and head <= end:
+                clock.jump(head if not args.tick else clock.time() + args.tick)
+
+                cpu = time.process_time()
+                now, first = clock.time(), len(ticks) % len(cogs)
+                await asyncio.gather(*(self.tick(cog, now) for cog in cogs[first:] + cogs[:first]))
+                ticks.append(time.process_time() - cpu)
+
+            written = io_written() - written if written != None else None
+
+            for cog in cogs:
+                await cog.cog_unload()
+
+        stats = [cog.delivery.stats() for cog in cogs]
+        lag = sorted(latency for cog in cogs for latency in cog.delivery.latency)
+        duplicates = sum(max(count - 1, 0) for count in delivered.values())
+
+        print(f"cold load:        {load:.2f}s")
+        print(f"delivered:        {sum(stat['delivered'] for stat in stats)} reminders in {self.messages} messages ({sum(stat['failed'] for stat in stats)} failed, {duplicates} duplicates)")
+        if args.instances > 1:
+            print(f"per instance:     {' | '.join(str(stat['delivered']) for stat in stats)}")
+        print(f"ticks:            {len(ticks)}")
+        print(f"lag (ms):         p50 {ms(percentile(lag, 0.50))} | p90 {ms(percentile(lag, 0.90))} | p99 {ms(percentile(lag, 0.99))} | max {ms(percentile(lag, 1))}")
+        print(f"cpu/tick (ms):    p50 {ms(percentile(sorted(ticks), 0.50))} | p99 {ms(percentile(sorted(ticks), 0.99))} | total {sum(ticks):.2f}s")
+        print(f"bytes written:    {'n/a' if written == None else f'{written / 1024**2:.1f} MiB'}")
+        print(f"peak rss:         {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MiB")
+
+    async def tick(self, cog, now: float):
+        # yield between claims so the other instances get to claim while this one delivers
+        while due := cog.scheduler.pop_due(now):
+            await cog.send_reminder(due)
+            await asyncio.sleep(0)
+        await cog.delivery.queue.join()
+
+    def recorder(self, done, delivered: dict):
+        '''
+        Wraps a delivery callback to count how many times each reminder was delivered.
+        '''
+        def record(user_id: str, reminders: list[dict], sent: bool | None):
+            for reminder in reminders:
+                delivered[reminder['id']] = delivered.get(reminder['id'], 0) + bool(sent)
+            done(user_id, reminders, sent)
+        return record
+
+def percentile(values: list[float], p: float) -> float | None:
+    if values:
+        return values[min(len(values) - 1, int(p * len(values)))]
+
+def ms(seconds: float | None) -> str:
+    return "-" if seconds == None else f"{seconds * 1000:.1f}"
+
+def io_written() -> int | None:
+    '''
+    Bytes this process has passed to write() so far (Linux).
+    '''
+    try:
+        with open("/proc/self/io", 'r') as f:
+            return int(next(line for line in f if line.startswith("wchar:")).split()[1])
+    except (OSError, StopIteration):
+        return None
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reminder scheduler simulation and load benchmark.")
+    parser.add_argument("--users", type=int, default=1000, help="number of users")
+    parser.add_argument("--reminders", type=int, default=100, help="reminders per user")
+    parser.add_argument("--horizon", type=float, default=7 * 86400, help="seconds of virtual time to simulate")
+    parser.add_argument("--burst", type=float, default=0.05, help="share of reminders due in the same minute")
+    parser.add_argument("--tick", type=float, default=0, help="fixed tick in seconds (default: jump to each due time)")
+    parser.add_argument("--send-latency", type=float, default=0, help="stub DM latency in milliseconds")
+    parser.add_argument("--failures", type=float, default=0, help="share of sends failing with a 503")
+    parser.add_argument("--instances", type=int, default=1, help="bot instances sharing the database")
+    parser.add_argument("--claim-limit", type=int, default=reminder_scheduler.CLAIM_LIMIT, help="rows an instance claims at a time")
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    asyncio.run(Simulation(args).run())
@@ -0,0 +1,294 @@
+'''
+Riot command replay benchmark against the offline stand-in server (`bench/riot_stub.py`).
+
+Starts the stand-in on its own thread and event loop, points `riot_tools` at it (`RIOT_BASE_URL`) from a throwaway
+working directory, registers `--registered` players through `/register`, then replays a trace of `/summoner`,
+`/stats`, `/ladder` and `/splash` invocations through `RiotCog` with `--concurrency` concurrent users.
+
+Reports per command: invocations, requests issued (logical requests, including the background work they trigger),
+wall time percentiles, and overall the stand-in's request and 429 counts and the governor's queueing stats.\n
+The trace is generated from `--seed` or replayed from `--trace` (JSON lines, as written by `--save-trace`).
+
+Usage (from the repository root):
+    python -m bench.riot_replay --commands 500 --concurrency 10 --latency 30
+'''
+import os
+import json
+import time
+import random
+import asyncio
+import argparse
+import resource
+import tempfile
+import threading
+import traceback
+import contextvars
+from collections import Counter
+
+from bench.riot_stub import CHAMPIONS, NAMES, add_arguments, from_arguments
+
+# command mix of generated traces
+MIX = {'summoner': 4, 'stats': 2, 'splash': 3, 'ladder': 1}
+
+command = contextvars.ContextVar('command', default="background")
+
+class StubMember():
+    def __init__(self, id: int):
+        self.id = id
+        self.display_name = f"member-{id}"
+        self.display_avatar = "https://cdn.discordapp.com/embed/avatars/0.png"
+        self.mention = f"<@{id}>"
+
+class StubGuild():
+    def __init__(self, members: dict[int, StubMember]):
+        self.name = "Bench"
+        self.members = members
+
+    def get_member(self, id: int) -> StubMember | None:
+        return self.members.get(id)
+
+class Typing():
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+class StubChannel():
+    def typing(self) -> Typing:
+        return Typing()
+
+class StubContext():
+    '''
+    Just enough of `commands.Context` for `RiotCog`: replies are counted, not sent.
+    '''
+    def __init__(self, author: StubMember, guild: StubGuild):
+        self.author = author
+        self.guild = guild
+        self.channel = StubChannel()
+        self.replies = []
+
+    async def send(self, content: str = None, **kwargs):
+        self.replies.append(kwargs.get('embed') or content)
+
+    async def reply(self, content: str = None, **kwargs):
+        await self.send(content, **kwargs)
+
+class Replay():
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.members = {10**17 + i: StubMember(10**17 + i) for i in range(args.registered)}
+        self.guild = StubGuild(self.members)
+
+        self.requests = Counter()       # command -> requests issued
+        self.times: dict[str, list[float]] = {}
+        self.errors = Counter()
+
+    def trace(self) -> list[dict]:
+        '''
+        Returns the invocations to replay: `{'command', 'user', 'arg'}` with `user` the invoking member's index.
+        '''
+        if self.args.trace:
+            with open(self.args.trace, 'r') as f:
+                return [json.loads(line) for line in f if line.strip()]
+
+        registered, players = self.args.registered, self.args.players
+        commands = random.choices(list(MIX), weights=list(MIX.values()), k=self.args.commands)
+
+        trace = []
+        for name in commands:
+            user = random.randrange(registered)
+            arg = None
+
+            if name in ('summoner', 'stats'):
+                # self, another registered member or an unregistered Riot ID
+                if (roll := random.random()) < 0.3:
+                    arg = f"<@{10**17 + random.randrange(registered)}>"
+                elif roll < 0.5 and players > registered:
+                    arg = f"Player{random.randrange(registered, players)}#NA1"
+
+            elif name == 'splash':
+                champion = NAMES.get(champion := random.choice(CHAMPIONS), champion)
+                arg = champion if random.random() < 0.7 else champion[:random.randint(3, len(champion))].lower()
+
+            trace.append({'command': name, 'user': user, 'arg': arg})
+
+        if self.args.save_trace:
+            with open(self.args.save_trace, 'w') as f:
+                f.writelines(json.dumps(invocation) + "\n" for invocation in trace)
+
+        return trace
+
+    def count(self, fetch):
+        '''
+        Wraps a client fetch to count requests against the command whose context issued them.
+        '''
+        async def counted(*args, **kwargs):
+            self.requests[command.get()] += 1
+            return await fetch(*args, **kwargs)
+        return counted
+
+    async def invoke(self, cog, invocation: dict):
+        name, arg = invocation['command'], invocation.get('arg')
+        ctx = StubContext(self.members[10**17 + invocation['user'] % len(self.members)], self.guild)
+        command.set(name)
+
+        # commands by name, `cog.ladder` is the rank index
+        commands = {command.name: command for command in cog.get_commands()}
+
+        t = time.perf_counter()
+        try:
+            if name == 'register':
+                await commands['register'](ctx, riot_id=arg)
+            elif name == 'summoner':
+                await commands['summoner'](ctx, user=arg)
+            elif name == 'stats':
+                await commands['stats'](ctx, 100, user=arg)
+            elif name == 'ladder':
+                await commands['ladder'](ctx)
+            elif name == 'splash':
+                await commands['splash'](ctx, arg)
+        except Exception:
+            if not self.errors[name]:
+                traceback.print_exc()
+            self.errors[name] += 1
+        self.times.setdefault(name, []).append(time.perf_counter() - t)
+
+    async def run(self, url: str):
+        args = self.args
+
+        with tempfile.TemporaryDirectory() as directory:
+            cwd = os.getcwd()
+            os.chdir(directory)
+            os.makedirs("json")
+            os.environ["RIOT_BASE_URL"] = url
+            os.environ["RIOT_KEY"] = "stub"
+            if args.mirror:
+                os.environ["DD_MIRROR"] = "json/assets"
+
+            try:
+                # riot_tools reads the environment and opens its match store on import
+                import cogs.riot as riot_cog
+                import modules.riot_tools as riot
+
+                riot.client.fetch = self.count(riot.client.fetch)
+                riot.client.fetch_bytes = self.count(riot.client.fetch_bytes)
+
+                cog = riot_cog.RiotCog(bot=None)
+                for cog_command in cog.get_commands():
+                    cog_command.cog = cog       # done by bot.add_cog
+                trace = self.trace()
+
+                if args.mirror:
+                    t = time.perf_counter()
+                    await riot.get_dd_version()
+                    if riot.mirror.task:
+                        await riot.mirror.task
+                    print(f"mirrored:         {riot.mirror.stats()['assets']} assets in {time.perf_counter() - t:.2f}s")
+
+                t = time.perf_counter()
+                for i in range(args.registered):
+                    await asyncio.create_task(self.invoke(cog, {'command': 'register', 'user': i, 'arg': f"Player{i}#NA1"}))
+                register = time.perf_counter() - t
+
+                if args.settle:
+                    await asyncio.sleep(args.settle)
+
+                queue = asyncio.Queue()
+                for invocation in trace:
+                    queue.put_nowait(invocation)
+
+                async def worker():
+                    while not queue.empty():
+                        await asyncio.create_task(self.invoke(cog, queue.get_nowait()))
+
+                t = time.perf_counter()
+                await asyncio.gather(*[worker() for _ in range(args.concurrency)])
+                wall = time.perf_counter() - t
+
+                governors = riot.client.stats()
+                coalesced = riot.client.flights.coalesced
+                await cog.cog_unload()
+                riot.matches.close()
+            finally:
+                os.chdir(cwd)
+
+        return register, wall, governors, coalesced, len(trace)
+
+    def report(self, server, register: float, wall: float, governors: dict, coalesced: int, commands: int):
+        print(f"registered:       {self.args.registered} players in {register:.2f}s")
+        print(f"replayed:         {commands} commands in {wall:.2f}s ({commands / wall:.1f}/s, concurrency {self.args.concurrency})")
+        print()
+        print(f"{'command':<10} {'count':>6} {'errors':>6} {'requests':>9} {'req/cmd':>8} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+        for name in ('register', *MIX, 'background'):
+            times = sorted(self.times.get(name, []))
+            if not times and not self.requests[name]:
+                continue
+            print(f"{name:<10} {len(times):>6} {self.errors[name]:>6} {self.requests[name]:>9} "
+                  f"{self.requests[name] / len(times) if times else 0:>8.1f} {ms(percentile(times, 0.50)):>8} "
+                  f"{ms(percentile(times, 0.99)):>8} {ms(percentile(times, 1)):>8}")
+        print()
+
+        stats = server.stats()
+        print(f"stand-in:         {stats['requests']} requests | {stats['limited']} answered 429")
+        print(f"coalesced:        {coalesced}")
+        for host, stats in governors.items():
+            waits = " | ".join(f"{priority} p99 {ms(stats[priority]['p99'])}" for priority in ('interactive', 'background'))
+            print(f"{host.removeprefix('https://'):<36} {stats['requests']} requests | {stats['queued']} queued | {stats['throttled']} throttled | wait (ms) {waits}")
+        print(f"peak rss:         {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MiB")
+
+class ServerThread(threading.Thread):
+    '''
+    Runs the stand-in on its own event loop, so its work does not show up as bot latency.
+    '''
+    def __init__(self, server):
+        super().__init__(daemon=True)
+        self.server = server
+        self.ready = threading.Event()
+        self.url = None
+        self.loop = None
+
+    def run(self):
+        self.loop = asyncio.new_event_loop()
+        self.url = self.loop.run_until_complete(self.server.start())
+        self.ready.set()
+        self.loop.run_forever()
+        self.loop.run_until_complete(self.server.stop())
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.join()
+
+def percentile(values: list[float], p: float) -> float | None:
+    if values:
+        return values[min(len(values) - 1, int(p * len(values)))]
+
+def ms(seconds: float | None) -> str:
+    return "-" if seconds == None else f"{seconds * 1000:.1f}"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Riot command replay benchmark against the offline stand-in server.")
+    parser.add_argument("--commands", type=int, default=500, help="commands in a generated trace")
+    parser.add_argument("--registered", type=int, default=20, help="players registered before the replay (at most --players)")
+    parser.add_argument("--concurrency", type=int, default=10, help="concurrent users")
+    parser.add_argument("--mirror", action="store_true", help="build and serve from the Data Dragon asset mirror")
+    parser.add_argument("--settle", type=float, default=0, help="seconds to let background ingestion run before the replay")
+    parser.add_argument("--trace", default=None, help="JSON lines trace to replay instead of a generated one")
+    parser.add_argument("--save-trace", default=None, help="write the generated trace here")
+    add_arguments(parser)
+    args = parser.parse_args()
+    args.registered = max(1, min(args.registered, args.players))
+
+    random.seed(args.seed)
+    server = from_arguments(args)
+    thread = ServerThread(server)
+    thread.start()
+    thread.ready.wait()
+
+    replay = Replay(args)
+    try:
+        results = asyncio.run(replay.run(thread.url))
+    finally:
+        thread.stop()
+
+    replay.report(server, *results)
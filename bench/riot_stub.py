@@ -0,0 +1,422 @@
+'''
+Offline stand-in for the Riot API and Data Dragon.
+
+One HTTP server answers for every host, routed by the `Host` header (`RiotClient` sends the original host when it is
+pointed at a `base_url`). Responses come from recorded fixtures when present, otherwise from a deterministic
+synthetic data set of `--players` players with `--matches` matches each.\n
+Riot API hosts enforce sliding-window app and method rate limits and send the `X-*-Rate-Limit(-Count)` headers the
+governor reads. Latency and a share of injected 429s are configurable.
+
+Fixtures are files laid out as `<dir>/<host><path>`, e.g. `fixtures/americas.api.riotgames.com/lol/match/v5/matches/NA1_1`
+(query strings are ignored). With `--record`, misses are fetched from the real host (with the caller's `X-Riot-Token`)
+and saved there.
+
+Usage (from the repository root):
+    python -m bench.riot_stub --port 8080
+    RIOT_BASE_URL=http://127.0.0.1:8080 python bot.py
+'''
+import os
+import re
+import time
+import random
+import asyncio
+import argparse
+import mimetypes
+from collections import deque, Counter
+
+import aiohttp
+from aiohttp import web
+
+from modules.riot_client import parse_limits
+
+VERSIONS = ["14.24.1", "14.23.1", "14.22.1"]
+CHAMPIONS = ["Aatrox", "Ahri", "Akali", "Ashe", "Blitzcrank", "Caitlyn", "Darius", "Ekko", "Ezreal", "Garen", "Jinx",
+             "Kaisa", "Katarina", "LeeSin", "Leona", "Lux", "MissFortune", "Nautilus", "Orianna", "Riven", "Sett",
+             "Sylas", "Thresh", "Vayne", "Viego", "Yasuo", "Yone", "Zed"]
+NAMES = {'Kaisa': "Kai'Sa", 'LeeSin': "Lee Sin", 'MissFortune': "Miss Fortune"}
+POSITIONS = ["TOP", "JUNGLE", "MIDDLE", "BOTTOM", "UTILITY"]
+TIERS = ["IRON", "BRONZE", "SILVER", "GOLD", "PLATINUM", "EMERALD", "DIAMOND", "MASTER"]
+DIVISIONS = ["IV", "III", "II", "I"]
+
+# production-like limits, a development key is 20:1,100:120
+APP_LIMITS = "500:10,30000:600"
+METHOD_LIMITS = "2000:10"
+
+# profile icons of a release, bytes of synthetic images
+ICONS = 1000
+ICON_SIZE = 16 * 1024
+SPLASH_SIZE = 400 * 1024
+
+class Window():
+    '''
+    Sliding-window counters of one rate limit header (`500:10,30000:600`).
+    '''
+    def __init__(self, limits: str):
+        self.limits = [(count, window, deque()) for count, window in parse_limits(limits)]
+
+    def hit(self, now: float) -> float:
+        '''
+        Count a request. Returns 0, or the seconds until it would have been allowed if it is over the limit.
+        '''
+        wait = 0.0
+        for count, window, times in self.limits:
+            while times and times[0] <= now - window:
+                times.popleft()
+            if len(times) >= count:
+                wait = max(wait, times[0] + window - now)
+
+        if not wait:
+            for _, _, times in self.limits:
+                times.append(now)
+        return wait
+
+    def header(self) -> str:
+        return ",".join(f"{count}:{window}" for count, window, _ in self.limits)
+
+    def counts(self) -> str:
+        return ",".join(f"{len(times)}:{window}" for _, window, times in self.limits)
+
+class Fixtures():
+    '''
+    Deterministic synthetic Riot API and Data Dragon responses.
+
+    Player `i` is `Player{i}#NA1` (puuid `stub-puuid-{i}`) on na1. Match `n` is played by player `n % players` and
+    nine filler accounts, each player has `matches` matches, newest first.
+    '''
+    def __init__(self, players: int, matches: int, seed: int = 0):
+        self.players = players
+        self.matches = matches
+        self.seed = seed
+        self.start = 1_700_000_000_000     # newest match creation, epoch milliseconds
+
+        noise = random.Random(seed)
+        self.icon = noise.randbytes(ICON_SIZE)
+        self.splash = noise.randbytes(SPLASH_SIZE)
+
+        self.routes: list[tuple[re.Pattern, str, object]] = [
+            (re.compile(r"/riot/account/v1/accounts/by-riot-id/([^/]+)/([^/]+)"), "account-v1.getByRiotId", self.account_by_name),
+            (re.compile(r"/riot/account/v1/accounts/by-puuid/([^/]+)"), "account-v1.getByPuuid", self.account),
+            (re.compile(r"/riot/account/v1/region/by-game/lol/by-puuid/([^/]+)"), "account-v1.getByPuuidAndGame", self.region),
+            (re.compile(r"/lol/summoner/v4/summoners/by-puuid/([^/]+)"), "summoner-v4.getByPUUID", self.summoner),
+            (re.compile(r"/lol/league/v4/entries/by-summoner/([^/]+)"), "league-v4.getLeagueEntriesForSummoner", self.league),
+            (re.compile(r"/lol/champion-mastery/v4/champion-masteries/by-puuid/([^/]+)/top"), "champion-mastery-v4.getTopChampionMasteriesByPUUID", self.masteries),
+            (re.compile(r"/lol/match/v5/matches/by-puuid/([^/]+)/ids"), "match-v5.getMatchIdsByPUUID", self.match_ids),
+            (re.compile(r"/lol/match/v5/matches/([^/]+)"), "match-v5.getMatch", self.match),
+            (re.compile(r"/api/versions.json"), "versions", self.versions),
+            (re.compile(r"/cdn/[^/]+/data/en_US/champion.json"), "champions", self.champions),
+            (re.compile(r"/cdn/[^/]+/data/en_US/champion/([^/]+).json"), "champion", self.champion),
+            (re.compile(r"/cdn/[^/]+/data/en_US/profileicon.json"), "icons", self.icons),
+            (re.compile(r"/cdn/[^/]+/img/profileicon/[0-9]+.png"), "icon", lambda query: self.icon),
+            (re.compile(r"/cdn/[^/]+/img/champion/[^/]+.png"), "square", lambda query: self.icon),
+            (re.compile(r"/cdn/img/champion/splash/[^/]+.jpg"), "splash", lambda query: self.splash),
+        ]
+
+    def route(self, path: str) -> tuple[str, object] | tuple[None, None]:
+        '''
+        Returns the method name (rate limit bucket) of a path and a function answering it (`None` for a 404).
+        '''
+        for pattern, method, answer in self.routes:
+            if match := pattern.fullmatch(path):
+                return method, lambda query, answer=answer, args=match.groups(): answer(*args, query)
+        return None, None
+
+    def player(self, puuid: str) -> int | None:
+        if (i := puuid.removeprefix("stub-puuid-")).isdigit() and int(i) < self.players:
+            return int(i)
+
+    def rng(self, *key) -> random.Random:
+        # string seeds are hashed deterministically, unlike hash() of a tuple
+        return random.Random(":".join(map(str, (self.seed, *key))))
+
+    # account-v1, summoner-v4, league-v4, champion-mastery-v4
+
+    def account_by_name(self, gameName: str, tagLine: str, query) -> dict | None:
+        if (i := gameName.lower().removeprefix("player")).isdigit() and int(i) < self.players and tagLine.lower() == "na1":
+            return self.account(f"stub-puuid-{int(i)}", query)
+
+    def account(self, puuid: str, query) -> dict | None:
+        if (i := self.player(puuid)) != None:
+            return {'puuid': puuid, 'gameName': f"Player{i}", 'tagLine': "NA1"}
+
+    def region(self, puuid: str, query) -> dict | None:
+        if self.player(puuid) != None:
+            return {'puuid': puuid, 'game': "lol", 'region': "na1"}
+
+    def summoner(self, puuid: str, query) -> dict | None:
+        if (i := self.player(puuid)) != None:
+            rng = self.rng("summoner", i)
+            return {'id': f"stub-summoner-{i}", 'accountId': f"stub-account-{i}", 'puuid': puuid,
+                    'profileIconId': rng.randrange(ICONS), 'revisionDate': self.start, 'summonerLevel': rng.randrange(30, 600)}
+
+    def league(self, summonerId: str, query) -> list | None:
+        if not (i := summonerId.removeprefix("stub-summoner-")).isdigit():
+            return None
+
+        rng = self.rng("league", int(i))
+        if rng.random() < 0.2:
+            return []
+
+        tier = rng.choice(TIERS)
+        return [{'leagueId': f"stub-league-{tier}", 'queueType': "RANKED_SOLO_5x5", 'tier': tier,
+                 'rank': "I" if tier == "MASTER" else rng.choice(DIVISIONS), 'summonerId': summonerId,
+                 'leaguePoints': rng.randrange(0, 100 if tier != "MASTER" else 500), 'wins': rng.randrange(10, 300),
+                 'losses': rng.randrange(10, 300), 'veteran': False, 'inactive': False, 'freshBlood': False, 'hotStreak': False}]
+
+    def masteries(self, puuid: str, query) -> list | None:
+        if (i := self.player(puuid)) == None:
+            return None
+
+        rng = self.rng("masteries", i)
+        champions = rng.sample(range(len(CHAMPIONS)), min(int(query.get('count', 3)), len(CHAMPIONS)))
+        points = sorted((rng.randrange(1000, 1_000_000) for _ in champions), reverse=True)
+        return [{'puuid': puuid, 'championId': champion + 1, 'championLevel': min(7, points // 20000 + 1), 'championPoints': points,
+                 'lastPlayTime': self.start, 'chestGranted': False, 'tokensEarned': 0} for champion, points in zip(champions, points)]
+
+    # match-v5
+
+    def created(self, n: int) -> int:
+        # every player's k-th newest match starts 40 minutes before their (k-1)-th
+        return self.start - (n // self.players) * 2_400_000
+
+    def match_ids(self, puuid: str, query) -> list | None:
+        if (i := self.player(puuid)) == None:
+            return None
+
+        start, count = int(query.get('start', 0)), int(query.get('count', 20))
+        startTime = int(query.get('startTime', 0)) * 1000
+
+        ids = [f"NA1_{n}" for n in range(i, self.players * self.matches, self.players) if self.created(n) >= startTime]
+        return ids[start:start + count]
+
+    def match(self, matchId: str, query) -> dict | None:
+        if not (n := matchId.removeprefix("NA1_")).isdigit() or int(n) >= self.players * self.matches:
+            return None
+
+        n = int(n)
+        rng = self.rng("match", n)
+        duration = rng.randrange(900, 2400)
+        owner = n % self.players
+        puuids = [f"stub-puuid-{owner}"] + [f"stub-filler-{n}-{j}" for j in range(1, 10)]
+
+        participants = []
+        for j, puuid in enumerate(puuids):
+            team = 100 if j < 5 else 200
+            champion = CHAMPIONS[rng.randrange(len(CHAMPIONS))]
+            participant = {
+                'puuid': puuid, 'participantId': j + 1, 'teamId': team, 'win': (team == 100) == (n % 2 == 0),
+                'championName': champion, 'championId': CHAMPIONS.index(champion) + 1, 'teamPosition': POSITIONS[j % 5],
+                'kills': rng.randrange(0, 15), 'deaths': rng.randrange(0, 12), 'assists': rng.randrange(0, 20),
+                'totalMinionsKilled': rng.randrange(0, 300), 'neutralMinionsKilled': rng.randrange(0, 60),
+                'goldEarned': rng.randrange(5000, 20000), 'riotIdGameName': puuid, 'riotIdTagline': "NA1",
+            }
+
+            # the rest of a real ParticipantDto: ~100 stat fields and ~120 challenges
+            participant.update({f"stat{k}": rng.randrange(0, 50000) for k in range(100)})
+            participant['challenges'] = {f"challenge{k}": rng.random() * 100 for k in range(120)}
+            participant['perks'] = {'statPerks': {'defense': 5001, 'flex': 5008, 'offense': 5005},
+                                    'styles': [{'description': style, 'style': 8000, 'selections': [{'perk': 8005, 'var1': 1, 'var2': 2, 'var3': 3}] * 4}
+                                               for style in ("primaryStyle", "subStyle")]}
+            participants.append(participant)
+
+        teams = [{'teamId': team, 'win': participants[0 if team == 100 else 5]['win'], 'bans': [],
+                  'objectives': {'champion': {'first': False, 'kills': sum(p['kills'] for p in participants if p['teamId'] == team)}}}
+                 for team in (100, 200)]
+
+        return {'metadata': {'dataVersion': "2", 'matchId': matchId, 'participants': puuids},
+                'info': {'gameCreation': self.created(n), 'gameDuration': duration, 'gameEndTimestamp': self.created(n) + duration * 1000,
+                         'gameId': n, 'gameMode': "CLASSIC", 'gameType': "MATCHED_GAME", 'gameVersion': VERSIONS[0], 'mapId': 11,
+                         'platformId': "NA1", 'queueId': 420, 'participants': participants, 'teams': teams}}
+
+    # Data Dragon
+
+    def versions(self, query) -> list:
+        return VERSIONS
+
+    def summary(self, id: str) -> dict:
+        return {'id': id, 'key': str(CHAMPIONS.index(id) + 1), 'name': NAMES.get(id, id), 'title': "the Stand-in",
+                'tags': ["Fighter"], 'image': {'full': f"{id}.png"}}
+
+    def champions(self, query) -> dict:
+        return {'type': "champion", 'version': VERSIONS[0], 'data': {id: self.summary(id) for id in CHAMPIONS}}
+
+    def icons(self, query) -> dict:
+        return {'type': "profileicon", 'version': VERSIONS[0],
+                'data': {str(id): {'id': id, 'image': {'full': f"{id}.png"}} for id in range(ICONS)}}
+
+    def champion(self, id: str, query) -> dict | None:
+        if id not in CHAMPIONS:
+            return None
+
+        skins = [{'id': f"{CHAMPIONS.index(id) + 1}{num:03d}", 'num': num, 'name': "default" if not num else f"Stand-in {NAMES.get(id, id)} {num}", 'chromas': False}
+                 for num in range(self.rng("skins", id).randrange(3, 12))]
+        return {'type': "champion", 'version': VERSIONS[0], 'data': {id: self.summary(id) | {'skins': skins, 'lore': "." * 2000}}}
+
+class StubServer():
+    '''
+    aiohttp server answering for every Riot API and Data Dragon host.
+    '''
+    def __init__(self, fixtures: Fixtures, path: str = None, record: bool = False, latency: float = 0, jitter: float = 0,
+                 throttle: float = 0, retry_after: float = 1, app_limits: str = APP_LIMITS, method_limits: str = METHOD_LIMITS):
+        self.fixtures = fixtures
+        self.path = path
+        self.record = record
+        self.latency = latency
+        self.jitter = jitter
+        self.throttle = throttle
+        self.retry_after = retry_after
+        self.app_limits = app_limits
+        self.method_limits = method_limits
+
+        self.windows: dict[tuple[str, str], Window] = {}     # (host, method or "") -> window
+        self.requests = Counter()       # (host, method) -> requests
+        self.limited = Counter()        # (host, method) -> 429s
+        self.session: aiohttp.ClientSession | None = None
+        self.runner: web.AppRunner | None = None
+
+        self.app = web.Application()
+        self.app.router.add_get("/{tail:.*}", self.handle)
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        '''
+        Start listening. Returns the base URL.
+        '''
+        self.runner = web.AppRunner(self.app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, host, port)
+        await site.start()
+
+        port = self.runner.addresses[0][1]
+        return f"http://{host}:{port}"
+
+    async def stop(self):
+        if self.session:
+            await self.session.close()
+        if self.runner:
+            await self.runner.cleanup()
+
+    def window(self, host: str, method: str) -> Window:
+        if not (window := self.windows.get((host, method))):
+            window = self.windows[host, method] = Window(self.method_limits if method else self.app_limits)
+        return window
+
+    async def handle(self, request: web.Request) -> web.Response:
+        host = request.host.split(":")[0]
+        method, answer = self.fixtures.route(request.path)
+        self.requests[host, method] += 1
+
+        if self.latency or self.jitter:
+            await asyncio.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+
+        headers = {}
+        if host.endswith(".api.riotgames.com"):
+            if limited := self.limit(host, method or request.path, headers):
+                self.limited[host, method] += 1
+                return web.json_response({'status': {'message': "Rate limit exceeded", 'status_code': 429}}, status=429, headers=headers | limited)
+
+        if (body := await self.recorded(host, request)) != None:
+            return web.Response(body=body, headers=headers, content_type=mimetypes.guess_type(request.path)[0] or "application/json")
+
+        if not answer or (data := answer(request.query)) == None:
+            return web.json_response({'status': {'message': "Data not found", 'status_code': 404}}, status=404, headers=headers)
+
+        if isinstance(data, bytes):
+            return web.Response(body=data, headers=headers, content_type=mimetypes.guess_type(request.path)[0])
+
+        return web.json_response(data, headers=headers)
+
+    def limit(self, host: str, method: str, headers: dict) -> dict | None:
+        '''
+        Count a request against its host's app and method limits, filling in the rate limit headers.
+
+        Returns
+            the 429 headers if the request is over a limit (or picked for injection), otherwise `None`.
+        '''
+        now = time.monotonic()
+        app, bucket = self.window(host, ""), self.window(host, method)
+
+        if self.throttle and random.random() < self.throttle:
+            return {'Retry-After': f"{self.retry_after:g}", 'X-Rate-Limit-Type': "service"}
+
+        wait = app.hit(now)
+        kind = "application"
+        if not wait and (wait := bucket.hit(now)):
+            kind = "method"
+
+        headers.update({'X-App-Rate-Limit': app.header(), 'X-App-Rate-Limit-Count': app.counts(),
+                        'X-Method-Rate-Limit': bucket.header(), 'X-Method-Rate-Limit-Count': bucket.counts()})
+
+        if wait:
+            return {'Retry-After': str(max(1, round(wait))), 'X-Rate-Limit-Type': kind}
+
+    async def recorded(self, host: str, request: web.Request) -> bytes | None:
+        '''
+        Returns a recorded fixture, recording it first if `record` is set.
+        '''
+        if not self.path:
+            return None
+
+        path = os.path.join(self.path, host, request.path.lstrip("/"))
+        try:
+            with open(path, 'rb') as f:
+                return f.read()
+        except OSError:
+            if not self.record:
+                return None
+
+        if not self.session:
+            self.session = aiohttp.ClientSession()
+
+        headers = {key: value for key, value in request.headers.items() if key == 'X-Riot-Token'}
+        async with self.session.get(f"https://{host}{request.path}", params=request.query, headers=headers) as resp:
+            if resp.status != 200:
+                return None
+            body = await resp.read()
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(body)
+        return body
+
+    def stats(self) -> dict:
+        return {'requests': sum(self.requests.values()), 'limited': sum(self.limited.values()),
+                'by_method': {method or "unknown": count for (_, method), count in self.requests.most_common()}}
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--players", type=int, default=50, help="synthetic players")
+    parser.add_argument("--matches", type=int, default=200, help="synthetic matches per player")
+    parser.add_argument("--fixtures", default=None, help="directory of recorded fixtures, served before synthetic data")
+    parser.add_argument("--record", action="store_true", help="fetch fixture misses from the real hosts and save them")
+    parser.add_argument("--latency", type=float, default=30, help="response latency in milliseconds")
+    parser.add_argument("--jitter", type=float, default=10, help="latency jitter (+/-) in milliseconds")
+    parser.add_argument("--throttle", type=float, default=0, help="share of Riot API requests answered with an injected 429")
+    parser.add_argument("--retry-after", type=float, default=1, help="Retry-After of injected 429s in seconds")
+    parser.add_argument("--app-limits", default=APP_LIMITS, help="app rate limits per host")
+    parser.add_argument("--method-limits", default=METHOD_LIMITS, help="method rate limits per host")
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+
+def from_arguments(args: argparse.Namespace) -> StubServer:
+    return StubServer(Fixtures(args.players, args.matches, args.seed), args.fixtures, args.record, args.latency / 1000, args.jitter / 1000,
+                      args.throttle, args.retry_after, args.app_limits, args.method_limits)
+
+async def serve(args: argparse.Namespace):
+    server = from_arguments(args)
+    url = await server.start(args.host, args.port)
+    print(f"serving {args.players} players x {args.matches} matches on {url}")
+
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline Riot API and Data Dragon stand-in server.")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on")
+    parser.add_argument("--port", type=int, default=8080, help="port to listen on")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
@@ -1,52 +1,77 @@
-import json
+import os
 import re
+import asyncio
 import datetime
+import traceback
+import itertools
 from datetime import timedelta
-from modules.reminder_tools import parse_time
+from modules.reminder_tools import parse_reminder, next_occurrence, occurrences
+from modules.reminder_store import ReminderStore, ReminderList
+from modules.reminder_scheduler import ReminderScheduler, SharedReminderScheduler
+from modules.reminder_delivery import ReminderDelivery
 
 import discord
-from discord.ext import commands, tasks
+from discord.ext import commands
 
 JSON_PATH = 'json//reminders.json'
-DATE_PATTERN = r"[0-9]{4}-[0-9]{2}-[0-9]{2} [0-9]{2}:[0-9]{2}:[0-9]{2}-[0-9]{2}:[0-9]{2}"
+DB_PATH = 'json//reminders.db'
 
-def date_hook(json_dict):
-    for (key, value) in json_dict.items():
-        if isinstance(value, str) and re.match(DATE_PATTERN, value):
-            json_dict[key] = datetime.datetime.strptime(value, "%Y-%m-%d %H:%M:%S%z")
-    return json_dict
+# discord message limits
+MAX_FIELDS = 25
+MAX_EMBEDS = 10
+MAX_CHARS = 5500
+MAX_DESCRIPTION = 4096
+MAX_FIELD = 1024
+MAX_REPEAT = 100
+
+# upcoming occurrences listed for recurring reminders
+REPEAT_PREVIEW = 3
 
 class ReminderCog(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
 
+        # instances sharing a database claim due reminders from it instead of owning them
+        self.instance = os.getenv("REMINDER_INSTANCE")
+
         # load reminders
-        try:
-            with open(JSON_PATH, 'r') as f:
-                self.db = json.load(f, object_hook=date_hook)
-        except FileNotFoundError:
-            self.db = {}
+        self.store = ReminderStore(os.getenv("REMINDER_DB") or DB_PATH)
+        self.store.migrate_json(JSON_PATH)
 
-        # remove expired reminders
-        now = datetime.datetime.now(datetime.timezone.utc).astimezone()
-        for id in self.db:
-            expired = [reminder for reminder in self.db[id] if reminder['time'] <= now]
-            for reminder in expired:
-                self.db[id].remove(reminder)
+        if self.instance:
+            self.db = {}
+            self.scheduler = SharedReminderScheduler(self.store, self.instance)
 
-        # save reminders
-        with open(JSON_PATH, 'w') as f:
-            json.dump(self.db, f, indent=4, default=str)
+        # schedule reminders
+        # reminders that expired while offline are due immediately and delivered as one batch per user
+        else:
+            self.db = self.store.load()
+            self.scheduler = ReminderScheduler()
+            for id in self.db:
+                for reminder in self.db[id]:
+                    self.scheduler.push(id, reminder)
 
         # start reminding
-        self.remind.start()
+        self.delivery = ReminderDelivery(bot, render=self.render_reminder, done=self.delivered)
+        self.task = asyncio.create_task(self.remind())
         
         print(f'cog: {self.qualified_name} loaded')
 
-    def add_user(self, id: int):
-        self.db[str(id)] = []
-        with open(JSON_PATH, 'w') as f:
-            json.dump(self.db, f, indent=4, default=str)
+    async def cog_unload(self):
+        self.task.cancel()
+        self.delivery.stop()
+        self.store.close()
+
+    def get_user(self, id: int) -> ReminderList:
+        # another instance may have changed the user's reminders
+        if self.instance:
+            self.db[str(id)] = self.store.load_user(id)
+
+        # add user if user not in database
+        elif str(id) not in self.db:
+            self.db[str(id)] = ReminderList()
+
+        return self.db[str(id)]
 
     @commands.hybrid_command(brief='Set a reminder.', description='Set a reminder.')
     async def remindme(self, ctx: commands.Context, *, string: str = ""):
@@ -55,21 +80,18 @@ class ReminderCog(commands.Cog):
         now = ctx.message.created_at.astimezone().replace(microsecond=0)
         url = ctx.message.jump_url
 
-        # add user if user not in database
-        if str(id) not in self.db:
-            self.add_user(id)
-
-        user = self.db[str(id)]
+        user = self.get_user(id)
 
         # parse reminder
         try:
-            time, task = parse_time(string)
+            time, repeat, task = parse_reminder(string)
         except:
             examples = ("/remindme in 2h30m drink water\n"
                         "/remindme at 5pm on sept 21\n"
                         "/remindme thursday at 3:45 do laundry\n"
                         "/remindme on january 6 2021 raid capitol\n"
-                        "/remindme tmr 8am kiss the homies\n")
+                        "/remindme tmr 8am kiss the homies\n"
+                        "/remindme every monday at 9am standup\n")
 
             units = ("```y : years | mo : months | w : weeks | d : days\n"
                      "h : hours | m : minutes | s : seconds```")
@@ -89,18 +111,25 @@ class ReminderCog(commands.Cog):
             await error(ctx, "I cannot work backwards... maybe one day.")
             return
 
-        # add reminder
-        user.append({'time': time, 'task': task, 'url': url, 'created': now, 'modified': now})
+        if repeat:
+            if not (following := next_occurrence(repeat, time)):
+                await error(ctx, "That reminder would never repeat.")
+                return
 
-        # sort reminders by time
-        user = sorted(user, key=lambda x: x['time'])
+            if following - time < timedelta(minutes=1):
+                await error(ctx, "Reminders cannot repeat more than once a minute.")
+                return
 
-        # save reminders
-        with open(JSON_PATH, 'w') as f:
-            json.dump(self.db, f, indent=4, default=str)
+        # add reminder
+        reminder = {'time': time, 'task': task, 'url': url, 'created': now, 'modified': now, 'repeat': repeat}
+        self.store.insert(id, reminder)
+        self.scheduler.push(str(id), reminder)
+        user.add(reminder)
 
         # reply
         reply = f'I will remind you **<t:{round(time.timestamp())}:R>**'
+        if repeat:
+            reply += f' and **every {repeat}** after that'
         if task != "":
             reply += f'\n> *{task}*'
 
@@ -114,11 +143,7 @@ class ReminderCog(commands.Cog):
 
         id = ctx.author.id
 
-        # add user if user not in database
-        if str(id) not in self.db:
-            self.add_user(id)
-
-        user = self.db[str(id)]
+        user = self.get_user(id)
 
         # reply
         if len(user) == 0:
@@ -129,6 +154,8 @@ class ReminderCog(commands.Cog):
                 description += f'`[{i+1}]` | **<t:{round(reminder["time"].timestamp())}:R>**\n'
                 if reminder["task"] != "":
                     description = description[:-1] + " \u200b"*5 + f'**>** *{reminder["task"]}*\n'
+                if reminder["repeat"]:
+                    description += " \u200b"*5 + f'\u21BB *every {reminder["repeat"]}* \u00B7 then {upcoming(reminder)}\n'
 
             embed = discord.Embed(title="Your Reminders:", description=description)
 
@@ -143,11 +170,7 @@ class ReminderCog(commands.Cog):
         id = ctx.author.id
         now = ctx.message.created_at.astimezone().replace(microsecond=0)
 
-        # add user if user not in database
-        if str(id) not in self.db:
-            self.add_user(id)
-            
-        user = self.db[str(id)]
+        user = self.get_user(id)
 
         # if user has no reminders
         if len(user) == 0:
@@ -156,7 +179,7 @@ class ReminderCog(commands.Cog):
         
         # get recent
         if index == None:
-            recent = sorted(user, key=lambda x: x['modified'])[-1]
+            recent = user.recent()
 
             if now - recent['modified'] < timedelta(minutes=3):
                 index = user.index(recent) + 1
@@ -173,11 +196,10 @@ class ReminderCog(commands.Cog):
         reminder = user[abs(index)-1]
 
         # update modified
-        user[abs(index)-1]['modified'] = now
+        user.touch(reminder, now)
         
-        # save reminders
-        with open(JSON_PATH, 'w') as f:
-            json.dump(self.db, f, indent=4, default=str)
+        # save modified
+        self.store.touch(reminder)
 
         # reply
         reply = f'on **{reminder["time"].strftime("%b %d, %Y")}** at **{reminder["time"].strftime("%I:%M %p")}** \u00B7 <t:{round(reminder["time"].timestamp())}:R>\n'
@@ -190,6 +212,8 @@ class ReminderCog(commands.Cog):
         reply += f'\n**ID**: `[{abs(index)}]`'
         
         embed = discord.Embed(title="Reminder", description=reply)
+        if reminder['repeat']:
+            embed.add_field(name="Repeats", value=f'every {reminder["repeat"]} \u00B7 then {upcoming(reminder)}', inline=False)
         embed.add_field(name="Created", value=f'<t:{round(reminder["created"].timestamp())}:R>', inline=False)
         embed.add_field(name="Original Message", value=reminder['url'], inline=False)
         embed.set_footer(text=f'{ctx.author.display_name} \u00B7 /rm to delete this reminder', icon_url=ctx.author.display_avatar) 
@@ -202,11 +226,7 @@ class ReminderCog(commands.Cog):
         id = ctx.author.id
         now = ctx.message.created_at.astimezone().replace(microsecond=0)
 
-        # add user if user not in database
-        if str(id) not in self.db:
-            self.add_user(id)
-
-        user = self.db[str(id)]
+        user = self.get_user(id)
 
         # if user has no reminders
         if len(user) == 0:
@@ -215,7 +235,7 @@ class ReminderCog(commands.Cog):
         
         # delete recent
         if indexes == None:
-            recent = sorted(user, key=lambda x: x['modified'])[-1]
+            recent = user.recent()
 
             if now - recent['modified'] < timedelta(minutes=3):
                 indexes = [user.index(recent) + 1]
@@ -229,8 +249,7 @@ class ReminderCog(commands.Cog):
 
         # delete indexed
         elif matched := re.findall(r"\d+", indexes):
-            indexes = [int(i) for i in matched if int(i) <= len(user)]
-            indexes.sort()
+            indexes = sorted({int(i) for i in matched if 0 < int(i) <= len(user)})
 
         # if invalid index
         else:
@@ -241,16 +260,13 @@ class ReminderCog(commands.Cog):
             await error(ctx, "Invalid index.")
             return
         
-        # get reminders
-        reminders = [user[(i-1)] for i in indexes]
-        
         # delete reminders
+        reminders = user.pop([i-1 for i in indexes])
         for reminder in reminders:
-            user.remove(reminder)
+            self.scheduler.remove(reminder)
 
         # save reminders
-        with open(JSON_PATH, 'w') as f:
-            json.dump(self.db, f, indent=4, default=str)
+        self.store.delete(reminders)
 
         # reply
         description = ""
@@ -264,37 +280,145 @@ class ReminderCog(commands.Cog):
 
         await ctx.send(embed=embed)
 
-    @tasks.loop(seconds=5)
-    async def remind(self):
-        now = datetime.datetime.now(datetime.timezone.utc).astimezone()
+    @commands.command(hidden=True)
+    @commands.is_owner()
+    async def remindstats(self, ctx: commands.Context):
+        stats = self.delivery.stats()
+
+        def ms(seconds: float | None):
+            return "-" if seconds == None else f"{round(seconds * 1000)}ms"
+
+        reply = f"Pending: `{len(self.scheduler)}` | Queued: `{stats['queued']}` | Delivered: `{stats['delivered']}` | Failed: `{stats['failed']}`\n"
+        reply += f"Latency: p50 `{ms(stats['p50'])}` | p99 `{ms(stats['p99'])}` | max `{ms(stats['max'])}`"
 
-        # reminders are sorted by time
-        # for each user, check top reminder
-        for id in self.db:
-            if self.db[id] and (reminder := self.db[id][0])['time'] <= now:
-                author = await self.bot.fetch_user(int(id))
+        await ctx.reply(content=reply)
 
-                if reminder['task'] != "":
-                    embed = discord.Embed(title="Reminder", description=f'> *{reminder["task"]}*', timestamp=reminder["created"])
+    async def remind(self):
+        await self.bot.wait_until_ready()
+        self.delivery.start()
+        await self.scheduler.run(self.send_reminder)
+
+    async def send_reminder(self, due: list[tuple[str, dict]]):
+        # group reminders by user
+        batches = {}
+        for id, reminder in due:
+            # a rule that fails to expand has no further occurrence, the rest of the batch is unaffected
+            try:
+                time = self.next_time(reminder) if reminder['repeat'] else None
+            except Exception:
+                traceback.print_exc()
+                time = None
+
+            # recurring, move to the next occurrence and deliver a copy of this one
+            if time:
+                occurrence = dict(reminder)
+
+                if self.instance:
+                    reminder['time'] = time
                 else:
-                    embed = discord.Embed(title="Reminder", timestamp=reminder["created"])
+                    self.db[id].move(reminder, time)
 
-                embed.add_field(name="Original Message", value=reminder['url'])
-                embed.set_footer(text=f'{author.display_name}', icon_url=author.display_avatar)
+                self.store.reschedule(reminder)
+                self.scheduler.push(id, reminder)
+                reminder = occurrence
 
-                # send reminder
-                await author.send(embed=embed)
+            # one-shot (or last occurrence), deleted once delivered
+            else:
+                reminder['repeat'] = None
+                if not self.instance:
+                    self.db[id].remove(reminder)
+
+            batches.setdefault(id, []).append(reminder)
+
+        # send reminders
+        for id, reminders in batches.items():
+            self.delivery.enqueue(id, reminders)
+
+    def next_time(self, reminder: dict) -> datetime.datetime | None:
+        '''
+        Returns the first occurrence of a recurring reminder after now (occurrences missed while offline are skipped).
+        '''
+        now = datetime.datetime.fromtimestamp(self.scheduler.clock()).astimezone()
+        return next((time for time in occurrences(reminder['repeat'], reminder['time']) if time > now), None)
+
+    def render_reminder(self, author: discord.User, reminders: list[dict]) -> list[dict]:
+        '''
+        Renders a user's due reminders as few messages as possible.
+
+        Returns
+            :class:`list`: send kwargs for each message.
+        '''
+        # single reminder
+        if len(reminders) == 1:
+            reminder = reminders[0]
+
+            if reminder['task'] != "":
+                embed = discord.Embed(title="Reminder", description=f'> *{reminder["task"][:MAX_DESCRIPTION - len("> **")]}*', timestamp=reminder["created"])
+            else:
+                embed = discord.Embed(title="Reminder", timestamp=reminder["created"])
 
-                # delete reminder
-                self.db[id].remove(reminder)
+            embed.add_field(name="Original Message", value=reminder['url'])
+            if reminder['repeat']:
+                embed.add_field(name="Repeats", value=f'every {reminder["repeat"][:MAX_REPEAT]}')
+            embed.set_footer(text=f'{author.display_name}', icon_url=author.display_avatar)
 
-                # save reminders
-                with open(JSON_PATH, 'w') as f:
-                    json.dump(self.db, f, indent=4, default=str)
+            return [{'embed': embed}]
 
-    @remind.before_loop
-    async def before_remind(self):
-        await self.bot.wait_until_ready()
+        # multiple reminders, split into embeds/messages only when discord limits require it
+        fields = []
+        for reminder in reminders:
+            value = f'Due <t:{round(reminder["time"].timestamp())}:R> \u00B7 [Original Message]({reminder["url"]})'
+            if reminder['repeat']:
+                value += f' \u00B7 every {reminder["repeat"][:MAX_REPEAT]}'
+
+            # the task gets whatever the rest of the field leaves
+            if reminder['task'] != "" and (budget := MAX_FIELD - len(value) - len("> **\n")) > 0:
+                value = f'> *{reminder["task"][:budget]}*\n' + value
+            fields.append((f'Set {reminder["created"].strftime("%b %d, %Y")}', value))
+
+        title = f"Reminders ({len(reminders)})"
+        footer = f'{author.display_name}'
+
+        messages, embeds, embed, chars = [], [], None, 0
+        for name, value in fields:
+            size = len(name) + len(value)
+
+            # start a new message
+            if chars + size + len(title) + len(footer) > MAX_CHARS or (embed and len(embed.fields) == MAX_FIELDS and len(embeds) == MAX_EMBEDS):
+                messages.append({'embeds': embeds})
+                embeds, embed, chars = [], None, 0
+
+            # start a new embed
+            if not embed or len(embed.fields) == MAX_FIELDS:
+                embed = discord.Embed(title=title)
+                embed.set_footer(text=footer, icon_url=author.display_avatar)
+                embeds.append(embed)
+                chars += len(title) + len(footer)
+
+            embed.add_field(name=name, value=value, inline=False)
+            chars += size
+
+        messages.append({'embeds': embeds})
+
+        return messages
+
+    def delivered(self, id: str, reminders: list[dict], sent: bool | None):
+        # rejected as rendered (our bug), keep the rows but stop claiming them, a retry would fail the same way
+        # recurring reminders are already at their next occurrence
+        if sent == None:
+            print(f"reminders of {id} rejected by discord, parked in the store")
+            self.store.reject([reminder for reminder in reminders if not reminder['repeat']])
+            return
+
+        # recurring reminders stay in the store at their next occurrence
+        self.store.delete([reminder for reminder in reminders if not reminder['repeat']])
+
+def upcoming(reminder: dict) -> str:
+    '''
+    Lists the occurrences of a recurring reminder that follow the next one.
+    '''
+    following = itertools.islice(occurrences(reminder['repeat'], reminder['time']), 1, REPEAT_PREVIEW + 1)
+    return ", ".join(f'<t:{round(time.timestamp())}:f>' for time in following) or "nothing"
 
 async def error(ctx: commands.Context, description: str):
     embed = discord.Embed(title="Woops...", description=description)
@@ -1,15 +1,32 @@
-import os
+import io
 import re
 import json
-import requests
+import time
+import asyncio
 import urllib.parse
+from typing import Optional
 from datetime import timedelta
 import modules.riot_tools as riot
+import modules.match_stats as match_stats
+from modules.match_record import MatchRecord
+from modules.match_ingester import MatchIngester
+from modules.rank_ladder import RankLadder
+from modules.asset_mirror import AssetReader
 
 import discord
+from discord import app_commands
 from discord.ext import commands
 
 JSON_PATH = "json/summoners.json"
+MAX_STATS_MATCHES = 1000
+LADDER_SIZE = 25
+LADDER_STALE = 300
+
+# platform -> op.gg region
+OPGG_REGIONS = {
+    'na1': "na", 'br1': "br", 'la1': "lan", 'la2': "las", 'euw1': "euw", 'eun1': "eune", 'tr1': "tr", 'ru': "ru", 'me1': "me",
+    'kr': "kr", 'jp1': "jp", 'oc1': "oce", 'ph2': "ph", 'sg2': "sg", 'th2': "th", 'tw2': "tw", 'vn2': "vn",
+}
 
 class PaginationView(discord.ui.View):
     def __init__(self, skins: list, timeout: int = 180):
@@ -36,24 +53,27 @@ class PaginationView(discord.ui.View):
         await self.update_img(interaction=interaction)
 
     async def update_img(self, interaction: discord.Interaction):
-        if not (img_data := requests.get(self.skins[self.index]['url']).content):
+        if not (img_data := await riot.get_image(self.skins[self.index]['url'])):
             raise Exception("Failed to get image.")
 
         img_name = self.skins[self.index]['url'].split("/")[-1]
 
-        with open("downloads/" + img_name, "wb") as handler:
-            handler.write(img_data)
-
-        file = discord.File(fp="downloads/" + img_name)
+        file = image_file(img_data, img_name)
 
         embed = discord.Embed(title=self.skins[self.index]['name'].title(), description="\t")
         embed.set_image(url="attachment://" + img_name)
         embed.set_footer(text=f"{self.index + 1}/{len(self.skins)}")
 
+        # neighbors download while this one uploads
+        self.prefetch()
+
         await interaction.response.edit_message(embed=embed, attachments=[file])
 
-        file.close()
-        os.remove("downloads/" + img_name)
+    def prefetch(self):
+        '''
+        Download the previous and next skins in the background.
+        '''
+        riot.prefetch_images([self.skins[(self.index + step) % len(self.skins)]['url'] for step in (-1, 1)])
 
 class RiotCog(commands.Cog):
     def __init__(self, bot: commands.Bot):
@@ -66,8 +86,57 @@ class RiotCog(commands.Cog):
         except FileNotFoundError:
             self.db = {}
 
+        # keep Data Dragon metadata current
+        riot.dd.start()
+
+        # keep registered players' match history local
+        self.ingester = MatchIngester(self.players)
+        self.ingester.start()
+
+        # solo queue ranks of registered players
+        self.ladder = RankLadder(self.players)
+        self.ladder.start()
+
         print(f"cog: {self.qualified_name} loaded")
 
+    async def cog_unload(self):
+        riot.dd.stop()
+        self.ingester.stop()
+        self.ladder.stop()
+        await riot.client.close()
+
+    @commands.command(hidden=True)
+    @commands.is_owner()
+    async def riotstats(self, ctx: commands.Context):
+        def ms(seconds: float | None):
+            return "-" if seconds == None else f"{round(seconds * 1000)}ms"
+
+        reply = ""
+        for host, stats in riot.client.stats().items():
+            reply += f"**{host.removeprefix('https://')}**\n"
+            reply += f"Requests: `{stats['requests']}` | Queued: `{stats['queued']}` | Throttled: `{stats['throttled']}`\n"
+            reply += "App: " + " | ".join(f"`{used}/{count}` per {window}s" for used, count, window in stats['app']) + "\n"
+            for priority in ('interactive', 'background'):
+                reply += f"Wait ({priority}): p50 `{ms(stats[priority]['p50'])}` | p99 `{ms(stats[priority]['p99'])}` | max `{ms(stats[priority]['max'])}`\n"
+
+        reply += f"Coalesced: `{riot.client.flights.coalesced}`\n"
+
+        for name, cache in (("Accounts", riot.accounts), ("Summoners", riot.summoners), ("Ranked", riot.ranked), ("Masteries", riot.masteries)):
+            stats = cache.stats()
+            reply += f"{name}: `{stats['entries']}` cached | Hits: `{stats['hits']}` | Stale: `{stats['stale']}` | Misses: `{stats['misses']}`\n"
+
+        reply += f"Ingester: `{self.ingester.polls}` polls | `{self.ingester.ingested}` matches ingested\n"
+
+        if riot.mirror:
+            stats = riot.mirror.stats()
+            reply += f"Asset mirror: `{stats['version']}` | `{stats['assets']}` assets | `{stats['size'] / 1024**2:.1f} MiB` | Hits: `{stats['hits']}` | Misses: `{stats['misses']}`"
+            reply += f" | Building: `{stats['building']}`\n" if stats['building'] else "\n"
+
+        stats = riot.matches.stats()
+        reply += f"Match store: `{stats['matches']}` matches | `{stats['size'] / 1024**2:.1f}/{stats['budget'] / 1024**2:.0f} MiB` | Hits: `{stats['hits']}` | Misses: `{stats['misses']}`"
+
+        await ctx.reply(content=reply)
+
     @commands.hybrid_command(brief="Register your LoL account.", description="Register your LoL account.")
     async def register(self, ctx: commands.Context, *, riot_id: str):
         riot_id = riot_id.split("#")
@@ -76,11 +145,13 @@ class RiotCog(commands.Cog):
             await error(ctx, "Invalid Riot ID.\nRiot ID must be in the form {gameName}#{tagLine}.")
             return
 
-        if not (summoner := riot.get_summoner_by_name(riot_id[0], riot_id[1])):
+        if not (summoner := await riot.get_summoner_by_name(riot_id[0], riot_id[1])):
             await error(ctx, "Account not found.")
             return
 
         self.db[str(ctx.author.id)] = summoner
+        self.ingester.poke(summoner['puuid'], summoner['region'])
+        self.ladder.refresh()
 
         # save account
         with open(JSON_PATH, 'w') as f:
@@ -97,31 +168,42 @@ class RiotCog(commands.Cog):
         async with ctx.channel.typing():
             summoner, member = tupl
 
-            opgg_url = f"https://www.op.gg/summoners/na/{urllib.parse.quote(summoner['gameName'] + '-' + summoner['tagLine'])}"
+            opgg_url = f"https://www.op.gg/summoners/{OPGG_REGIONS.get(summoner['region'], 'na')}/{urllib.parse.quote(summoner['gameName'] + '-' + summoner['tagLine'])}"
 
             embed = discord.Embed(title=f"{summoner['gameName']} #{summoner['tagLine']}", description=f"**Level:** `{summoner['summonerLevel']}`" + " \u200b"*5 + f"**[OP.GG]({opgg_url})**")
-            embed.set_thumbnail(url=riot.get_summoner_icon(summoner['profileIconId']))
+
+            # independent lookups run concurrently, time-to-embed is the slowest chain
+            icon, stats, masteries, matches = await asyncio.gather(riot.get_summoner_icon(summoner['profileIconId']),
+                                                                   riot.get_stats_by_summoner(summoner['id'], summoner['region']),
+                                                                   get_masteries(summoner['puuid'], 3, summoner['region']),
+                                                                   self.get_matches(summoner['puuid'], 3, summoner['region']))
+
+            # attach the icon from the asset mirror, otherwise Discord fetches it from Data Dragon
+            file = None
+            if icon and (icon_data := riot.get_local_image(icon)):
+                file = image_file(icon_data, icon.split("/")[-1])
+                embed.set_thumbnail(url="attachment://" + file.filename)
+            else:
+                embed.set_thumbnail(url=icon)
+
             if member:
                 embed.set_author(name=member.display_name, icon_url=member.display_avatar)
 
             # get ranked stats
-            if stats := riot.get_stats_by_summoner(summoner['id']):
+            if stats:
                 for entry in [entry for entry in stats if "leagueId" in entry]:
                     embed.add_field(name=" ".join(entry['queueType'].split("_")[:-1]).title(), value=f"{entry['tier'].title()} {entry['rank']} `({entry['wins']}W|{entry['losses']}L)`")
 
             # get champion stats
-            if masteries := riot.get_champion_masteries_by_puuid(summoner['puuid'], 3):
-                for i, mastery in enumerate(masteries):
-                    if not (champion := riot.get_champion_by_id(mastery['championId'])):
-                        continue
-                    if i == 0:
-                        embed.add_field(name="\t", value="\t", inline=False)
-                        embed.add_field(name="Highest Champion Mastery", value="\t", inline=False)
+            if masteries:
+                embed.add_field(name="\t", value="\t", inline=False)
+                embed.add_field(name="Highest Champion Mastery", value="\t", inline=False)
 
+                for mastery, champion in masteries:
                     embed.add_field(name=champion['name'], value=f"Level: `{mastery['championLevel']}`\nPoints: `{mastery['championPoints']}`", inline=True)
             
             # get recent games
-            if matchId := riot.get_matchId_by_puuid(summoner['puuid'], 3):
+            if matches:
                 def win_str(win: bool):
                     if win: return "\u001b[0;34m[W]\u001b[0;0m"
                     return "\u001b[0;31m[L]\u001b[0;0m"
@@ -134,27 +216,38 @@ class RiotCog(commands.Cog):
                     if position == "UTILITY": return " (Support)"
                     return f" ({position.title()})"
                 
-                matches = list(filter(None, [riot.get_match_by_id(id) for id in matchId]))
                 value = ""
-                for matchDto in matches:
-                    infoDto = matchDto['info']
-                    participantDto = [participantDto for participantDto in infoDto['participants'] if participantDto['puuid'] == summoner['puuid']][0]
-                    teamDto = [teamDto for teamDto in infoDto['teams'] if teamDto['teamId'] == participantDto['teamId']][0]
-
-                    value += f"<t:{str(infoDto['gameCreation'] + infoDto['gameDuration']*1000)[:-3]}:R>\n"                                                                                  # {timestamp}
-                    value += f"```ansi\n{win_str(participantDto['win'])} {infoDto['gameMode']} | "                                                                                          # {win/loss} {gamemode}
-                    value += f"{participantDto['championName']}{pos_str(participantDto['teamPosition'])} | "                                                                                # {champion} {role}
-                    value += f"{time_str(infoDto['gameDuration'])}\n"                                                                                                                       # {duration}
-                    value += f"\u001b[0;36m{participantDto['kills']}/{participantDto['deaths']}/{participantDto['assists']}\u001b[0;0m "                                                    # {kda}
-                    value += f"\u001b[0;30m({round(100 * (participantDto['kills'] + participantDto['assists']) / teamDto['objectives']['champion']['kills'])}%)\u001b[0;0m | "              # {kill participation}
-                    value += f"CS: \u001b[0;36m{participantDto['totalMinionsKilled'] + participantDto['neutralMinionsKilled']}\u001b[0;0m"                                                  # {cs}
-                    value += f"\u001b[0;30m({round(60 * (participantDto['totalMinionsKilled'] + participantDto['neutralMinionsKilled']) / infoDto['gameDuration'], 1)})\u001b[0;0m | "      # {cs/min}
-                    value += f"Gold: \u001b[0;36m{participantDto['goldEarned']}\u001b[0;0m\n```"                                                                                            # {gold}
+                for match in matches:
+                    participant = match.participant(summoner['puuid'])
+
+                    value += f"<t:{(match.gameCreation + match.gameDuration*1000) // 1000}:R>\n"                                                    # {timestamp}
+                    value += f"```ansi\n{win_str(participant.win)} {match.gameMode} | "                                                             # {win/loss} {gamemode}
+                    value += f"{participant.championName}{pos_str(participant.teamPosition)} | "                                                     # {champion} {role}
+                    value += f"{time_str(match.gameDuration)}\n"                                                                                    # {duration}
+                    value += f"\u001b[0;36m{participant.kills}/{participant.deaths}/{participant.assists}\u001b[0;0m "                               # {kda}
+                    value += f"\u001b[0;30m({round(100 * match.kill_participation(participant))}%)\u001b[0;0m | "                                    # {kill participation}
+                    value += f"CS: \u001b[0;36m{participant.cs}\u001b[0;0m"                                                                         # {cs}
+                    value += f"\u001b[0;30m({round(60 * participant.cs / match.gameDuration, 1)})\u001b[0;0m | "                                      # {cs/min}
+                    value += f"Gold: \u001b[0;36m{participant.gold}\u001b[0;0m\n```"                                                                # {gold}
                 
                 embed.add_field(name="\t", value="\t", inline=False)
                 embed.add_field(name="Recent Games", value=value, inline=False)
 
-            await ctx.send(embed=embed)
+            await ctx.send(embed=embed, file=file)
+
+    async def get_matches(self, puuid: str, count: int = 3, platform: str = riot.DEFAULT_PLATFORM) -> list[MatchRecord] | None:
+        # registered players are answered from their ingested history, which is topped up in the background
+        if history := riot.matches.history(puuid, count):
+            self.ingester.poke(puuid, platform)
+            return history
+
+        return await get_matches(puuid, count, platform)
+
+    def players(self) -> dict[str, str | None]:
+        '''
+        Returns the registered players' puuids and platforms (`None` for registrations from before regions were stored).
+        '''
+        return {summoner['puuid']: summoner.get('region') for summoner in self.db.values()}
 
     async def get_summoner(self, ctx: commands.Context, user: str = None) -> tuple[dict, discord.Member] | None:
         if not user:
@@ -162,7 +255,7 @@ class RiotCog(commands.Cog):
                 await error(ctx, "You are not registered.")
                 return
     
-            if not (summoner := riot.get_summoner_by_puuid(self.db[id]['puuid'])):
+            if not (summoner := await riot.get_summoner_by_puuid(self.db[id]['puuid'], self.db[id].get('region'))):
                 await error(ctx, "Summoner not found.")
                 return
             
@@ -173,14 +266,14 @@ class RiotCog(commands.Cog):
                 await error(ctx, "User is not registered.")
                 return
             
-            if not (summoner := riot.get_summoner_by_puuid(self.db[id]['puuid'])):
+            if not (summoner := await riot.get_summoner_by_puuid(self.db[id]['puuid'], self.db[id].get('region'))):
                 await error(ctx, "Summoner not found.")
                 return
             
             return summoner, ctx.guild.get_member(int(id))
             
         elif len(riot_id := user.split("#")) == 2:
-            if not (summoner := riot.get_summoner_by_name(riot_id[0], riot_id[1])):
+            if not (summoner := await riot.get_summoner_by_name(riot_id[0], riot_id[1])):
                 await error(ctx, "Summoner not found.")
                 return
             
@@ -190,31 +283,140 @@ class RiotCog(commands.Cog):
             await error(ctx, "Invalid user.\nUser must be a member or a Riot ID in the form {gameName}#{tagLine}.")
             return
         
+    @commands.hybrid_command(brief="View summoner match stats.", description="View per-champion and per-role stats over recent matches.")
+    async def stats(self, ctx: commands.Context, count: Optional[int] = 100, *, user: str = None):
+        # get summoner
+        if not (tupl := await self.get_summoner(ctx, user)):
+            return
+
+        async with ctx.channel.typing():
+            summoner, member = tupl
+            count = max(1, min(count, MAX_STATS_MATCHES))
+
+            # registered players are answered from their ingested history, others from (at most 100) fetched matches
+            if rows := riot.matches.participants(summoner['puuid'], count):
+                self.ingester.poke(summoner['puuid'], summoner['region'])
+            else:
+                matches = await get_matches(summoner['puuid'], min(count, 100), summoner['region']) or []
+                rows = list(filter(None, [match_stats.participant_row(summoner['puuid'], match) for match in matches]))
+
+            if not rows:
+                await error(ctx, "No matches found.")
+                return
+
+            summary = await asyncio.to_thread(match_stats.summarize, rows)
+
+            def pct(value: float):
+                return f"{round(100 * value)}%"
+
+            def line(row: dict):
+                return (f"{row['name'][:12]:<12} {row['games']:>4} {pct(row['winrate']):>5} {row['kda']:>5.2f} "
+                        f"{row['cs_min']:>5.1f} {pct(row['kp']):>4} {round(row['gold_min']):>5}\n")
+
+            header = f"{'':<12} {'G':>4} {'WR':>5} {'KDA':>5} {'CS/m':>5} {'KP':>4} {'G/m':>5}\n"
+
+            overall = summary['overall']
+            description = f"**Games:** `{overall['games']}` | **Win Rate:** `{pct(overall['winrate'])}` | **KDA:** `{overall['kda']:.2f}`\n"
+            description += f"**CS/min:** `{overall['cs_min']:.1f}` | **Kill Participation:** `{pct(overall['kp'])}` | **Gold/min:** `{round(overall['gold_min'])}`"
+
+            embed = discord.Embed(title=f"{summoner['gameName']} #{summoner['tagLine']}", description=description)
+            if member:
+                embed.set_author(name=member.display_name, icon_url=member.display_avatar)
+
+            embed.add_field(name="Champions", value="```\n" + header + "".join(line(row) for row in summary['champions'][:10]) + "```", inline=False)
+            embed.add_field(name="Roles", value="```\n" + header + "".join(line(row) for row in summary['roles']) + "```", inline=False)
+
+            await ctx.send(embed=embed)
+
+    @commands.hybrid_command(brief="View the server's solo queue ladder.", description="View the server's solo queue ladder.")
+    async def ladder(self, ctx: commands.Context):
+        if not ctx.guild:
+            await error(ctx, "Ladder is only available in servers.")
+            return
+
+        # registered members of this server
+        members = {}
+        for id, summoner in self.db.items():
+            if member := ctx.guild.get_member(int(id)):
+                members.setdefault(summoner['puuid'], []).append(member)
+
+        if not members:
+            await error(ctx, "No members are registered.")
+            return
+
+        # render from the index, refresh it in the background (first use waits for it)
+        if not self.ladder.refreshed:
+            async with ctx.channel.typing():
+                await self.ladder.refresh()
+        elif time.time() - self.ladder.refreshed > LADDER_STALE:
+            self.ladder.refresh()
+
+        ranking = self.ladder.ranking(set(members))
+
+        description = ""
+        for i, (puuid, entry) in enumerate(ranking[:LADDER_SIZE]):
+            description += f"`#{i + 1}` **{entry['name']}** ({', '.join(member.mention for member in members[puuid])})\n"
+            description += f"> {entry['tier'].title()} {entry['rank'] if entry['tier'] not in ('MASTER', 'GRANDMASTER', 'CHALLENGER') else ''} `{entry['lp']} LP` `({entry['wins']}W|{entry['losses']}L)`\n"
+
+        embed = discord.Embed(title=f"{ctx.guild.name} Solo Queue Ladder", description=description or "No ranked members.")
+        embed.set_footer(text=f"{len(ranking)} ranked | {len(members) - len(ranking)} unranked | updated {round((time.time() - self.ladder.refreshed) / 60)} min ago")
+
+        await ctx.send(embed=embed)
+
     @commands.hybrid_command(brief="View champion splash art.", description="View champion splash art.")
     async def splash(self, ctx: commands.Context, champion: str):
-        if not (skins := riot.get_champion_skins_by_name(champion)):
+        if not (skins := await riot.get_champion_skins_by_name(champion)):
             await error(ctx, "Champion not found.")
             return
         
-        if not (img_data := requests.get(skins[0]['url']).content):
+        if not (img_data := await riot.get_image(skins[0]['url'])):
             await error(ctx, "Failed to get image.")
             return
         
         img_name = skins[0]['url'].split("/")[-1]
 
-        with open("downloads/" + img_name, "wb") as handler:
-            handler.write(img_data)
-
-        file = discord.File(fp="downloads/" + img_name)
+        file = image_file(img_data, img_name)
         
         embed = discord.Embed(title=skins[0]['name'].title(), description="\t")
         embed.set_image(url="attachment://" + img_name)
         embed.set_footer(text=f"1/{len(skins)}")
 
-        await ctx.send(embed=embed, file=file, view=PaginationView(skins))
-
-        file.close()
-        os.remove("downloads/" + img_name)
+        view = PaginationView(skins)
+        view.prefetch()
+
+        await ctx.send(embed=embed, file=file, view=view)
+
+    @splash.autocomplete('champion')
+    async def champion_autocomplete(self, interaction: discord.Interaction, current: str) -> list[app_commands.Choice[str]]:
+        ids = await riot.search_champions(current, 25)
+        return [app_commands.Choice(name=riot.dd.search.names[id], value=id) for id in ids]
+
+async def get_masteries(puuid: str, count: int = 3, platform: str = riot.DEFAULT_PLATFORM) -> list[tuple[dict, dict]] | None:
+    '''
+    Get top champion masteries with their champions, fetching the champions concurrently.\n
+    Returns: list[(ChampionMasteryDto, champion)]
+    '''
+    if not (masteries := await riot.get_champion_masteries_by_puuid(puuid, count, platform)):
+        return
+
+    champions = await asyncio.gather(*[riot.get_champion_by_id(mastery['championId']) for mastery in masteries])
+    return [(mastery, champion) for mastery, champion in zip(masteries, champions) if champion]
+
+async def get_matches(puuid: str, count: int = 3, platform: str = riot.DEFAULT_PLATFORM) -> list[MatchRecord] | None:
+    '''
+    Get recent matches, fetching them concurrently.\n
+    Returns: list[MatchRecord]
+    '''
+    if not (matchId := await riot.get_matchId_by_puuid(puuid, count, platform=platform)):
+        return
+
+    return list(filter(None, await asyncio.gather(*[riot.get_match_by_id(id) for id in matchId])))
+
+def image_file(data: bytes | memoryview, filename: str) -> discord.File:
+    '''
+    Wraps image data for upload without copying it: mirrored images are read straight from the archive mapping.
+    '''
+    return discord.File(fp=AssetReader(data) if isinstance(data, memoryview) else io.BytesIO(data), filename=filename)
 
 async def error(ctx: commands.Context, description: str):
     embed = discord.Embed(title="Woops...", description=description)
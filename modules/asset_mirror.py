@@ -0,0 +1,279 @@
+import io
+import os
+import re
+import json
+import mmap
+import struct
+import asyncio
+import traceback
+
+from modules.riot_client import RiotClient
+
+# magic, index offset, index length
+HEADER = struct.Struct("<8sQQ")
+MAGIC = b"DDASSET2"
+
+# what a mirror holds: versioned profile icons and champion squares (not the unversioned splash arts)
+MIRRORED = re.compile(r"/cdn/[^/]+/img/(profileicon|champion)/[^/]+\.png")
+
+# concurrent downloads while building an archive
+CONCURRENCY = 16
+
+class AssetArchive():
+    '''
+    Read-only archive of many small files in one file: a header, the files back to back and a JSON index
+    `{'files': {name: [offset, size]}, 'missing': [name]}` at the end (`missing` could not be downloaded).
+
+    The file is memory-mapped, so a lookup is a dict hit and the bytes are a `memoryview` of the mapping (no copy,
+    pages are shared with the OS cache and survive restarts).
+    '''
+    def __init__(self, path: str):
+        self.path = path
+
+        with open(path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            magic, offset, length = HEADER.unpack_from(self.map, 0)
+            if magic != MAGIC:
+                raise ValueError(f"not an asset archive: {path}")
+            index = json.loads(self.map[offset:offset + length])
+            self.index: dict[str, list[int]] = index['files']
+            self.missing: list[str] = index['missing']
+        except (struct.error, ValueError, KeyError, TypeError):
+            self.map.close()
+            raise
+
+        self.view = memoryview(self.map)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def get(self, name: str) -> memoryview | None:
+        if entry := self.index.get(name):
+            offset, size = entry
+            return self.view[offset:offset + size]
+
+    def close(self):
+        '''
+        Unmap the archive, unless views of it are still in use (then it is unmapped once they are released).
+        '''
+        try:
+            self.view.release()
+            self.map.close()
+        except BufferError:
+            pass
+
+class AssetReader(io.BufferedIOBase):
+    '''
+    Seekable read-only file over a `memoryview` (e.g. an archive entry), so uploads read straight from the mapping.
+    '''
+    def __init__(self, view: memoryview, name: str = None):
+        super().__init__()
+        self.view = view
+        self.pos = 0
+        if name:
+            self.name = name
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self.pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self.pos, io.SEEK_END: len(self.view)}[whence]
+        self.pos = max(0, base + offset)
+        return self.pos
+
+    def read(self, size: int = -1) -> bytes:
+        end = len(self.view) if size == None or size < 0 else min(len(self.view), self.pos + size)
+        data = self.view[self.pos:end].tobytes()
+        self.pos = max(self.pos, end)
+        return data
+
+    read1 = read
+
+    def readinto(self, buffer) -> int:
+        size = max(0, min(len(buffer), len(self.view) - self.pos))
+        buffer[:size] = self.view[self.pos:self.pos + size]
+        self.pos += size
+        return size
+
+class ArchiveWriter():
+    '''
+    Streams files into a new archive, which replaces `path` atomically on `close`.
+    '''
+    def __init__(self, path: str):
+        self.path = path
+        self.index: dict[str, tuple[int, int]] = {}
+        self.file = open(path + ".tmp", 'wb')
+        self.file.write(HEADER.pack(MAGIC, 0, 0))
+
+    def add(self, name: str, data: bytes | memoryview):
+        self.index[name] = (self.file.tell(), len(data))
+        self.file.write(data)
+
+    def close(self, missing: list[str] = ()):
+        offset = self.file.tell()
+        index = json.dumps({'files': self.index, 'missing': list(missing)}, separators=(',', ':')).encode()
+        self.file.write(index)
+        self.file.seek(0)
+        self.file.write(HEADER.pack(MAGIC, offset, len(index)))
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+        os.replace(self.path + ".tmp", self.path)
+
+    def abort(self):
+        self.file.close()
+        try:
+            os.remove(self.path + ".tmp")
+        except OSError:
+            pass
+
+class AssetMirror():
+    '''
+    Optional local mirror of a Data Dragon release's small images (profile icons and champion squares).
+
+    Once per patch every asset is downloaded into `{path}/{version}.assets` (an :class:`AssetArchive`) in the
+    background. Until it is built, and for anything not in it, `get` misses and callers fall back to Data Dragon.
+    Downloads that failed are recorded in the archive and retried on later updates of the same version, carrying
+    over what was already mirrored. Older archives are deleted once the new one is open.
+    '''
+    def __init__(self, client: RiotClient, host: str, path: str):
+        self.client = client
+        self.host = host
+        self.path = path
+
+        self.version: str | None = None     # version of the open archive
+        self.archive: AssetArchive | None = None
+        self.building: str | None = None
+        self.task: asyncio.Task | None = None
+
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def mirrors(path: str) -> bool:
+        '''
+        Whether a path is of a kind the mirror holds (callers skip `get` for anything else, e.g. splash arts).
+        '''
+        return MIRRORED.fullmatch(path) != None
+
+    def get(self, path: str) -> memoryview | None:
+        '''
+        Returns a mirrored asset (e.g. `/cdn/14.24.1/img/profileicon/29.png`), `None` if it is not mirrored.
+        '''
+        if self.archive and (data := self.archive.get(path)) != None:
+            self.hits += 1
+            return data
+
+        self.misses += 1
+        return None
+
+    def __contains__(self, path: str) -> bool:
+        return self.archive != None and path in self.archive
+
+    def open(self, version: str) -> bool:
+        '''
+        Serve the archive of `version` if it is on disk.
+        '''
+        try:
+            archive = AssetArchive(os.path.join(self.path, f"{version}.assets"))
+        except (OSError, ValueError):
+            return False
+
+        old, self.archive, self.version = self.archive, archive, version
+        if old:
+            old.close()
+
+        for entry in os.listdir(self.path):
+            if entry.endswith(".assets") and entry != f"{version}.assets":
+                try:
+                    os.remove(os.path.join(self.path, entry))
+                except OSError:
+                    pass
+
+        return True
+
+    def update(self, version: str, champions: dict[str, dict]):
+        '''
+        Serve `version`, building its archive in the background if it is not on disk (or retrying its missing assets).
+        '''
+        if version == self.building:
+            return
+
+        if version == self.version or self.open(version):
+            if not self.archive.missing:
+                return
+
+        if self.task:
+            self.task.cancel()
+
+        self.building = version
+        self.task = asyncio.create_task(self.build(version, champions))
+
+    def stop(self):
+        if self.task:
+            self.task.cancel()
+            self.task = None
+
+    async def build(self, version: str, champions: dict[str, dict]):
+        writer = None
+        try:
+            # retry what the archive of this version is missing, otherwise download everything
+            if (archive := self.archive) and self.version == version:
+                paths = archive.missing
+            else:
+                archive = None
+                paths = [f"/cdn/{version}/img/champion/{champion['image']['full']}" for champion in champions.values()]
+                if not (icons := await self.client.get(self.host, f"/cdn/{version}/data/en_US/profileicon.json")):
+                    return
+                paths += [f"/cdn/{version}/img/profileicon/{icon['image']['full']}" for icon in icons['data'].values()]
+
+            os.makedirs(self.path, exist_ok=True)
+            writer = ArchiveWriter(os.path.join(self.path, f"{version}.assets"))
+            semaphore = asyncio.Semaphore(CONCURRENCY)
+            missing = []
+
+            if archive:
+                for name in archive.index:
+                    writer.add(name, archive.get(name))
+
+            async def download(path: str):
+                async with semaphore:
+                    if data := await self.client.get_bytes(self.host, path):
+                        writer.add(path, data)
+                    else:
+                        missing.append(path)
+
+            await asyncio.gather(*[download(path) for path in paths])
+            await asyncio.to_thread(writer.close, missing)
+            writer = None
+
+            self.open(version)
+
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            traceback.print_exc()
+        finally:
+            if writer:
+                writer.abort()
+            if self.building == version:
+                self.building = None
+
+    def stats(self) -> dict:
+        '''
+        Returns the mirrored version, asset count, archive size and hit/miss counts.
+        '''
+        size = self.archive.map.size() if self.archive and not self.archive.map.closed else 0
+        return {'version': self.version, 'assets': len(self.archive) if self.archive else 0, 'size': size,
+                'building': self.building, 'hits': self.hits, 'misses': self.misses}
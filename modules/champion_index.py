@@ -0,0 +1,130 @@
+import re
+import bisect
+
+# common nicknames, normalized alias -> champion id
+ALIASES = {
+    'asol': "AurelionSol",
+    'blitz': "Blitzcrank",
+    'cait': "Caitlyn",
+    'cass': "Cassiopeia",
+    'ez': "Ezreal",
+    'fiddle': "Fiddlesticks",
+    'gp': "Gangplank",
+    'heimer': "Heimerdinger",
+    'j4': "JarvanIV",
+    'kassa': "Kassadin",
+    'kat': "Katarina",
+    'kha': "Khazix",
+    'kog': "KogMaw",
+    'lb': "Leblanc",
+    'liss': "Lissandra",
+    'malph': "Malphite",
+    'mf': "MissFortune",
+    'monkey': "MonkeyKing",
+    'mord': "Mordekaiser",
+    'morg': "Morgana",
+    'mundo': "DrMundo",
+    'naut': "Nautilus",
+    'noc': "Nocturne",
+    'ori': "Orianna",
+    'rek': "RekSai",
+    'sej': "Sejuani",
+    'tf': "TwistedFate",
+    'tk': "TahmKench",
+    'trist': "Tristana",
+    'trynd': "Tryndamere",
+    'vel': "Velkoz",
+    'vlad': "Vladimir",
+    'voli': "Volibear",
+    'ww': "Warwick",
+    'xin': "XinZhao",
+    'yi': "MasterYi",
+}
+
+# minimum share of the query's trigrams a fuzzy match must have
+MIN_SIMILARITY = 0.3
+
+class ChampionIndex():
+    '''
+    Champion name search index, built once per Data Dragon version.
+
+    Covers display names ("Wukong"), ids ("MonkeyKing") and `ALIASES`, normalized to lowercase letters and digits.\n
+    Lookups try an exact match, then a prefix match (bisect over the sorted terms), then trigram similarity.
+    '''
+    def __init__(self, champions: dict[str, dict], aliases: dict[str, str] = ALIASES):
+        self.names: dict[str, str] = {id: champion['name'] for id, champion in champions.items()}
+        self.terms: dict[str, str] = {}         # term -> id
+        self.trigrams: dict[str, set[str]] = {} # trigram -> terms
+        self.sizes: dict[str, int] = {}         # term -> number of trigrams
+
+        for id, champion in champions.items():
+            self.add(champion['name'], id)
+            self.add(id, id)
+
+        for alias, id in aliases.items():
+            if id in champions:
+                self.add(alias, id)
+
+        self.sorted = sorted(self.terms)
+
+    def add(self, term: str, id: str):
+        if not (term := normalize(term)) or term in self.terms:
+            return
+
+        self.terms[term] = id
+        self.sizes[term] = len(grams := trigrams(term))
+        for trigram in grams:
+            self.trigrams.setdefault(trigram, set()).add(term)
+
+    def search(self, query: str, limit: int = 25) -> list[str]:
+        '''
+        Returns the ids of the champions best matching `query`, best first.
+        '''
+        if not (query := normalize(query)):
+            return sorted(self.names, key=self.names.get)[:limit]
+
+        found = []
+
+        def extend(terms):
+            for term in terms:
+                if (id := self.terms[term]) not in found:
+                    found.append(id)
+
+        # exact
+        if query in self.terms:
+            extend([query])
+
+        # prefix, shortest terms first
+        i = bisect.bisect_left(self.sorted, query)
+        prefixed = []
+        while i < len(self.sorted) and self.sorted[i].startswith(query):
+            prefixed.append(self.sorted[i])
+            i += 1
+        extend(sorted(prefixed, key=len))
+
+        # fuzzy, by shared trigrams
+        if len(found) < limit:
+            grams = trigrams(query)
+            counts: dict[str, int] = {}
+            for trigram in grams:
+                for term in self.trigrams.get(trigram, ()):
+                    counts[term] = counts.get(term, 0) + 1
+
+            scored = [(count / max(len(grams), self.sizes[term]), term) for term, count in counts.items()]
+            extend(term for score, term in sorted(scored, reverse=True) if score >= MIN_SIMILARITY)
+
+        return found[:limit]
+
+    def best(self, query: str) -> str | None:
+        '''
+        Returns the id of the champion best matching `query`, `None` if nothing is close.
+        '''
+        if found := self.search(query, 1):
+            return found[0]
+
+def normalize(string: str) -> str:
+    return re.sub(r"[^a-z0-9]", "", string.lower())
+
+def trigrams(term: str) -> set[str]:
+    padded = f"  {term} "
+    return {padded[i:i+3] for i in range(len(padded) - 2)}
@@ -0,0 +1,246 @@
+import os
+import json
+import time
+import shutil
+import asyncio
+import traceback
+from collections import OrderedDict
+
+from modules.riot_client import RiotClient
+from modules.champion_index import ChampionIndex
+from modules.asset_mirror import AssetMirror
+
+DD_URL = "https://ddragon.leagueoflegends.com"
+CACHE_PATH = "json/ddragon"
+
+# how often the latest version is checked, how many champion details are kept in memory
+VERSION_TTL = 3600
+DETAIL_CACHE_SIZE = 32
+
+# memory budget for images (splash arts are 100-500 KB)
+IMAGE_CACHE_BYTES = 64 * 1024**2
+
+class DataDragon():
+    '''
+    Data Dragon metadata cache keyed on the patch version.
+
+    Holds the champion summaries with a championId (`key`) index and a name search index in memory and the most
+    recently used champion details in an LRU. Everything is also written under `CACHE_PATH/{version}` so a restart is warm.\n
+    The version is refreshed in the background; a new patch swaps in a new index and drops the old one.\n
+    Images are kept in a separate LRU capped at `IMAGE_CACHE_BYTES` and can be prefetched in the background. With a
+    `mirror`, images of the current patch it holds are served from it instead.
+    '''
+    def __init__(self, client: RiotClient, path: str = CACHE_PATH, clock = time.time, mirror: AssetMirror = None):
+        self.client = client
+        self.path = path
+        self.clock = clock
+        self.mirror = mirror
+
+        self.version: str | None = None
+        self.checked = 0.0
+        self.champions: dict[str, dict] = {}    # id (e.g. "MonkeyKing") -> summary
+        self.keys: dict[str, str] = {}          # key (e.g. "62") -> id
+        self.search: ChampionIndex = ChampionIndex({})
+        self.details: OrderedDict[str, dict] = OrderedDict()
+        self.lock = asyncio.Lock()
+        self.task: asyncio.Task | None = None
+
+        self.images: OrderedDict[str, bytes] = OrderedDict()
+        self.image_bytes = 0
+        self.prefetches: set[asyncio.Task] = set()
+
+        self.load()
+
+    def load(self):
+        '''
+        Load the latest version on disk.
+        '''
+        try:
+            with open(os.path.join(self.path, "version.json"), 'r') as f:
+                version = json.load(f)['version']
+            with open(os.path.join(self.path, version, "champion.json"), 'r') as f:
+                self.index(version, json.load(f))
+            if self.mirror:
+                self.mirror.open(version)
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def index(self, version: str, champions: dict):
+        '''
+        Swap in the champion summaries of a version.
+        '''
+        self.version = version
+        self.champions = champions
+        self.keys = {champion['key']: id for id, champion in champions.items()}
+        self.search = ChampionIndex(champions)
+        self.details = OrderedDict()
+
+    def start(self):
+        '''
+        Start refreshing the version in the background.
+        '''
+        if not self.task:
+            self.task = asyncio.create_task(self.run())
+
+    def stop(self):
+        if self.task:
+            self.task.cancel()
+            self.task = None
+
+        for task in self.prefetches:
+            task.cancel()
+
+        if self.mirror:
+            self.mirror.stop()
+
+    async def run(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception:
+                traceback.print_exc()
+            await asyncio.sleep(VERSION_TTL)
+
+    async def refresh(self) -> str | None:
+        '''
+        Check the latest version, downloading its champion summaries if it changed.
+
+        Returns
+            :class:`str`: the current version, `None` if unknown.
+        '''
+        async with self.lock:
+            if not (versions := await self.client.get(DD_URL, "/api/versions.json")):
+                return self.version
+
+            self.checked = self.clock()
+            if versions[0] != self.version:
+                if not (champions := await self.client.get(DD_URL, f"/cdn/{versions[0]}/data/en_US/champion.json")):
+                    return self.version
+
+                self.index(versions[0], champions['data'])
+                await asyncio.to_thread(self.save, self.version, self.champions)
+
+            # once per patch, also retried on later checks if a build failed
+            if self.mirror:
+                self.mirror.update(self.version, self.champions)
+
+            return self.version
+
+    def save(self, version: str, champions: dict):
+        '''
+        Write a version's champion summaries and drop older versions from disk.
+        '''
+        os.makedirs(os.path.join(self.path, version), exist_ok=True)
+        write(os.path.join(self.path, version, "champion.json"), champions)
+        write(os.path.join(self.path, "version.json"), {'version': version})
+
+        for entry in os.listdir(self.path):
+            if entry != version and os.path.isdir(os.path.join(self.path, entry)):
+                shutil.rmtree(os.path.join(self.path, entry), ignore_errors=True)
+
+    async def get_version(self) -> str | None:
+        '''
+        Returns the current version, fetching it if it was never loaded or the background refresh is not running.
+        '''
+        if self.version == None or (not self.task and self.clock() - self.checked > VERSION_TTL):
+            return await self.refresh()
+        return self.version
+
+    async def get_champions(self) -> dict | None:
+        '''
+        Returns champion summaries by id.
+        '''
+        if await self.get_version():
+            return self.champions
+
+    async def get_champion_id(self, championId: int | str) -> str | None:
+        '''
+        Returns the champion id (e.g. "MonkeyKing") of a championId (e.g. 62).
+        '''
+        if await self.get_version():
+            return self.keys.get(str(championId))
+
+    async def search_champions(self, query: str, limit: int = 25) -> list[str]:
+        '''
+        Returns the ids of the champions best matching a name, id or alias, best first.
+        '''
+        if await self.get_version():
+            return self.search.search(query, limit)
+        return []
+
+    async def get_champion(self, id: str) -> dict | None:
+        '''
+        Returns champion details by id, from memory, disk or Data Dragon.
+        '''
+        if not (version := await self.get_version()) or id not in self.champions:
+            return None
+
+        if champion := self.details.get(id):
+            self.details.move_to_end(id)
+            return champion
+
+        path = os.path.join(self.path, version, f"{id}.json")
+        try:
+            champion = await asyncio.to_thread(read, path)
+        except (OSError, ValueError):
+            if not (data := await self.client.get(DD_URL, f"/cdn/{version}/data/en_US/champion/{id}.json")):
+                return None
+            champion = data['data'][id]
+            await asyncio.to_thread(write, path, champion)
+
+        # version changed while fetching
+        if version != self.version:
+            return champion
+
+        self.details[id] = champion
+        while len(self.details) > DETAIL_CACHE_SIZE:
+            self.details.popitem(last=False)
+
+        return champion
+
+    async def get_image(self, path: str) -> bytes | memoryview | None:
+        '''
+        Returns an image (e.g. `/cdn/img/champion/splash/Ahri_0.jpg`), from the mirror or memory when possible.
+        '''
+        if self.mirror and self.mirror.mirrors(path) and (data := self.mirror.get(path)) != None:
+            return data
+
+        if (data := self.images.get(path)) != None:
+            self.images.move_to_end(path)
+            return data
+
+        if not (data := await self.client.get_bytes(DD_URL, path)):
+            return None
+
+        if path not in self.images and len(data) <= IMAGE_CACHE_BYTES:
+            self.images[path] = data
+            self.image_bytes += len(data)
+            while self.image_bytes > IMAGE_CACHE_BYTES:
+                self.image_bytes -= len(self.images.popitem(last=False)[1])
+
+        return data
+
+    def prefetch_images(self, paths: list[str]):
+        '''
+        Download images into the cache in the background.
+        '''
+        for path in paths:
+            if path not in self.images and not (self.mirror and self.mirror.mirrors(path) and path in self.mirror):
+                task = asyncio.create_task(self.get_image(path))
+                self.prefetches.add(task)
+                task.add_done_callback(self.prefetches.discard)
+
+def read(path: str):
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def write(path: str, data):
+    '''
+    Write JSON atomically.
+    '''
+    try:
+        with open(path + ".tmp", 'w') as f:
+            json.dump(data, f)
+        os.replace(path + ".tmp", path)
+    except OSError:
+        pass
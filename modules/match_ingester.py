@@ -0,0 +1,106 @@
+import asyncio
+import traceback
+
+import modules.riot_tools as riot
+from modules.riot_client import BACKGROUND
+
+# seconds between polls of every player, matches backfilled for a new player (match-v5 caps a page at 100)
+INTERVAL = 600
+BACKFILL = 100
+
+# pokes for a player polled more recently than this are ignored
+MIN_POKE = 60
+
+class MatchIngester():
+    '''
+    Background ingestion of registered players' matches into the local match store.
+
+    Every `INTERVAL` each player is polled for match IDs started since their latest stored match, and only the new
+    matches are fetched, at `BACKGROUND` priority so the rate limit governor keeps them behind interactive commands.
+    '''
+    def __init__(self, players, interval: float = INTERVAL):
+        self.players = players      # players() -> {puuid: platform or None} of the registered players
+        self.interval = interval
+        self.task: asyncio.Task | None = None
+        self.pending: dict[str, str | None] = {}
+        self.polled: dict[str, float] = {}
+        self.wakeup = asyncio.Event()
+
+        self.polls = 0
+        self.ingested = 0
+
+    def start(self):
+        if not self.task:
+            self.task = asyncio.create_task(self.run())
+
+    def stop(self):
+        if self.task:
+            self.task.cancel()
+            self.task = None
+
+    def poke(self, puuid: str, platform: str = None):
+        '''
+        Poll a player ahead of the next round.
+        '''
+        if asyncio.get_running_loop().time() - self.polled.get(puuid, float('-inf')) < MIN_POKE:
+            return
+
+        self.pending[puuid] = platform
+        self.wakeup.set()
+
+    async def run(self):
+        while True:
+            for puuid, platform in list(self.players().items()):
+                await self.safe_ingest(puuid, platform)
+
+            # sleep until the next round, polling poked players in between
+            # (pokes made during the round or a drain are drained before waiting, so none is lost)
+            deadline = asyncio.get_running_loop().time() + self.interval
+            while True:
+                while self.pending:
+                    await self.safe_ingest(*self.pending.popitem())
+
+                if (delay := deadline - asyncio.get_running_loop().time()) <= 0:
+                    break
+
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                self.wakeup.clear()
+
+    async def safe_ingest(self, puuid: str, platform: str = None):
+        try:
+            await self.ingest(puuid, platform)
+        except Exception:
+            traceback.print_exc()
+
+    async def ingest(self, puuid: str, platform: str = None) -> int:
+        '''
+        Fetch a player's matches newer than the latest one in their history, on `platform` (default: their region).
+
+        Returns
+            :class:`int`: number of matches added.
+        '''
+        self.polls += 1
+        self.polled[puuid] = asyncio.get_running_loop().time()
+        latest = riot.matches.latest(puuid)
+        platform = platform or await riot.get_platform(puuid, priority=BACKGROUND)
+
+        if not (matchIds := await riot.get_matchId_by_puuid(puuid, BACKFILL, latest, platform, priority=BACKGROUND)):
+            return 0
+
+        known = riot.matches.known(puuid, matchIds)
+        if not (new := [matchId for matchId in matchIds if matchId not in known]):
+            return 0
+
+        fetched = await asyncio.gather(*[riot.get_match_by_id(matchId, priority=BACKGROUND) for matchId in new])
+
+        added = 0
+        for matchId, match in zip(new, fetched):
+            if match:
+                riot.matches.add_history(puuid, matchId, match)
+                added += 1
+
+        self.ingested += added
+        return added
@@ -0,0 +1,101 @@
+import numpy as np
+
+from modules.match_record import MatchRecord
+
+# participant row layout, one row per (player, match)
+FIELDS = ("created", "champion", "role", "win", "kills", "deaths", "assists", "cs", "gold", "duration", "team_kills")
+NUMERIC = FIELDS[3:]
+
+ROLES = {"TOP": "Top", "JUNGLE": "Jungle", "MIDDLE": "Mid", "BOTTOM": "Bot", "UTILITY": "Support", "": "None"}
+
+def participant_row(puuid: str, match: MatchRecord) -> tuple | None:
+    '''
+    Returns a player's row of a match (laid out as `FIELDS`), `None` if they did not play in it.
+    '''
+    if not (participant := match.participant(puuid)):
+        return None
+
+    return (match.gameCreation // 1000, participant.championName, participant.teamPosition, int(participant.win),
+            participant.kills, participant.deaths, participant.assists, participant.cs, participant.gold,
+            match.gameDuration, match.team_kills.get(participant.teamId, 0))
+
+class MatchTable():
+    '''
+    Columnar (NumPy) view of a player's participant rows.
+
+    Numeric fields are `int64` columns, champions and roles are categorical (codes into `champions`/`roles`), so
+    every aggregate is a handful of vectorized `bincount`s instead of a Python loop over MatchDtos.
+    '''
+    def __init__(self, rows: list[tuple]):
+        self.size = len(rows)
+
+        columns = list(zip(*rows)) if rows else [()] * len(FIELDS)
+        data = dict(zip(FIELDS, columns))
+
+        self.numeric = {field: np.asarray(data[field], dtype=np.int64) for field in NUMERIC}
+        self.champions, self.champion = np.unique(np.asarray(data['champion'], dtype=str), return_inverse=True)
+        self.roles, self.role = np.unique(np.asarray(data['role'], dtype=str), return_inverse=True)
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, field: str) -> np.ndarray:
+        return self.numeric[field]
+
+    def aggregate(self, codes: np.ndarray = None, groups: int = 1) -> dict[str, np.ndarray]:
+        '''
+        Aggregates every row into `groups` groups by `codes` (default: one group).
+
+        Returns
+            :class:`dict`: games, win rate, KDA, CS/min, kill participation, average gold and gold/min per group.
+        '''
+        if codes is None:
+            codes = np.zeros(self.size, dtype=np.int64)
+
+        def total(field: str) -> np.ndarray:
+            return np.bincount(codes, weights=self[field], minlength=groups)
+
+        games = np.bincount(codes, minlength=groups)
+        kills, deaths, assists = total('kills'), total('deaths'), total('assists')
+        minutes = total('duration') / 60
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return {
+                'games': games,
+                'winrate': total('win') / games,
+                'kda': (kills + assists) / np.maximum(deaths, 1),
+                'kills': kills / games,
+                'deaths': deaths / games,
+                'assists': assists / games,
+                'cs_min': total('cs') / minutes,
+                'kp': (kills + assists) / np.maximum(total('team_kills'), 1),
+                'gold': total('gold') / games,
+                'gold_min': total('gold') / minutes,
+            }
+
+    def by_champion(self) -> list[dict]:
+        return self.group(self.champions, self.champion)
+
+    def by_role(self) -> list[dict]:
+        return self.group(np.asarray([ROLES.get(role, role.title()) for role in self.roles]), self.role)
+
+    def group(self, names: np.ndarray, codes: np.ndarray) -> list[dict]:
+        '''
+        Returns one row of aggregates per group, most played first.
+        '''
+        stats = self.aggregate(codes, len(names))
+        order = np.argsort(-stats['games'], kind='stable')
+
+        return [{'name': str(names[i]), **{key: values[i].item() for key, values in stats.items()}} for i in order if stats['games'][i]]
+
+def summarize(rows: list[tuple]) -> dict:
+    '''
+    Aggregates participant rows overall, per champion and per role. CPU bound, meant to run off the event loop.
+    '''
+    table = MatchTable(rows)
+
+    return {
+        'overall': {key: values[0].item() for key, values in table.aggregate().items()} if len(table) else None,
+        'champions': table.by_champion(),
+        'roles': table.by_role(),
+    }
@@ -0,0 +1,202 @@
+import json
+import time
+import zlib
+import sqlite3
+
+from modules.match_record import MatchRecord
+from modules.match_stats import FIELDS, participant_row
+
+# on-disk budget for compressed payloads, eviction trims down to LOW_WATER of it
+BUDGET = 256 * 1024**2
+LOW_WATER = 0.9
+
+# access times are only rewritten when older than this, so hits are reads
+ACCESS_GRANULARITY = 3600
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS matches (
+    id       TEXT PRIMARY KEY,
+    data     BLOB NOT NULL,
+    size     INTEGER NOT NULL,
+    accessed INTEGER NOT NULL
+) STRICT;
+CREATE INDEX IF NOT EXISTS matches_accessed ON matches (accessed);
+CREATE TABLE IF NOT EXISTS history (
+    puuid    TEXT NOT NULL,
+    match_id TEXT NOT NULL,
+    created  INTEGER NOT NULL,
+    PRIMARY KEY (puuid, match_id)
+) WITHOUT ROWID, STRICT;
+CREATE INDEX IF NOT EXISTS history_created ON history (puuid, created);
+CREATE TABLE IF NOT EXISTS participants (
+    puuid      TEXT NOT NULL,
+    match_id   TEXT NOT NULL,
+    created    INTEGER NOT NULL,
+    champion   TEXT NOT NULL,
+    role       TEXT NOT NULL,
+    win        INTEGER NOT NULL,
+    kills      INTEGER NOT NULL,
+    deaths     INTEGER NOT NULL,
+    assists    INTEGER NOT NULL,
+    cs         INTEGER NOT NULL,
+    gold       INTEGER NOT NULL,
+    duration   INTEGER NOT NULL,
+    team_kills INTEGER NOT NULL,
+    PRIMARY KEY (puuid, match_id)
+) WITHOUT ROWID, STRICT;
+CREATE INDEX IF NOT EXISTS participants_created ON participants (puuid, created);
+'''
+
+INSERT_PARTICIPANT = f"INSERT OR IGNORE INTO participants (puuid, match_id, {', '.join(FIELDS)}) VALUES (?, ?{', ?' * len(FIELDS)})"
+
+class MatchStore():
+    '''
+    SQLite (WAL mode) store of finished matches (as :class:`MatchRecord`) keyed by matchId.
+
+    Matches never change once finished, so entries never expire. Records are stored as zlib compressed JSON and the
+    least recently used ones are evicted once the store grows past `budget` bytes.\n
+    Matches ingested into a player's `history` are kept regardless of the budget, along with the player's
+    `participants` row (the columns analytics need), so stats never have to decode MatchDtos.
+    '''
+    def __init__(self, path: str, budget: int = BUDGET, clock = time.time):
+        self.budget = budget
+        self.clock = clock
+
+        self.conn = sqlite3.connect(path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.conn:
+            for statement in SCHEMA.split(';'):
+                self.conn.execute(statement)
+
+        self.size = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM matches").fetchone()[0]
+        self.hits = 0
+        self.misses = 0
+
+        self.backfill()
+
+    def __contains__(self, matchId: str) -> bool:
+        return self.conn.execute("SELECT 1 FROM matches WHERE id = ?", (matchId,)).fetchone() != None
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM matches").fetchone()[0]
+
+    def close(self):
+        self.conn.close()
+
+    def get(self, matchId: str) -> MatchRecord | None:
+        '''
+        Returns a stored match, `None` on a miss.
+        '''
+        if not (row := self.conn.execute("SELECT data, accessed FROM matches WHERE id = ?", (matchId,)).fetchone()):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        data, accessed = row
+
+        if (now := round(self.clock())) - accessed > ACCESS_GRANULARITY:
+            with self.conn:
+                self.conn.execute("UPDATE matches SET accessed = ? WHERE id = ?", (now, matchId))
+
+        data = json.loads(zlib.decompress(data))
+
+        # full MatchDto stored before matches were projected
+        if isinstance(data, dict):
+            return MatchRecord.from_dto(data)
+
+        return MatchRecord.from_list(data)
+
+    def put(self, matchId: str, match: MatchRecord):
+        '''
+        Store a match, evicting the least recently used ones if over budget.
+        '''
+        data = zlib.compress(json.dumps(match.to_list(), separators=(',', ':')).encode(), 6)
+
+        with self.conn:
+            if old := self.conn.execute("SELECT size FROM matches WHERE id = ?", (matchId,)).fetchone():
+                self.size -= old[0]
+
+            self.conn.execute("INSERT OR REPLACE INTO matches (id, data, size, accessed) VALUES (?, ?, ?, ?)",
+                              (matchId, data, len(data), round(self.clock())))
+            self.size += len(data)
+
+            if self.size > self.budget:
+                self.evict(int(self.budget * LOW_WATER))
+
+    def evict(self, target: int):
+        '''
+        Delete the least recently used matches until the store is at most `target` bytes.
+        '''
+        evicted = []
+        for matchId, size in self.conn.execute("SELECT id, size FROM matches WHERE id NOT IN (SELECT match_id FROM history) ORDER BY accessed"):
+            if self.size <= target:
+                break
+            evicted.append((matchId,))
+            self.size -= size
+
+        self.conn.executemany("DELETE FROM matches WHERE id = ?", evicted)
+
+    def add_history(self, puuid: str, matchId: str, match: MatchRecord):
+        '''
+        Store a match and record it in a player's history.
+        '''
+        if matchId not in self:
+            self.put(matchId, match)
+
+        with self.conn:
+            self.conn.execute("INSERT OR IGNORE INTO history (puuid, match_id, created) VALUES (?, ?, ?)",
+                              (puuid, matchId, match.gameCreation // 1000))
+
+            if row := participant_row(puuid, match):
+                self.conn.execute(INSERT_PARTICIPANT, (puuid, matchId, *row))
+
+    def known(self, puuid: str, matchIds: list[str]) -> set[str]:
+        '''
+        Returns the matchIds already in a player's history.
+        '''
+        placeholders = ",".join("?" * len(matchIds))
+        rows = self.conn.execute(f"SELECT match_id FROM history WHERE puuid = ? AND match_id IN ({placeholders})", (puuid, *matchIds))
+        return {matchId for matchId, in rows}
+
+    def latest(self, puuid: str) -> int | None:
+        '''
+        Returns the creation time (epoch seconds) of a player's latest match in history.
+        '''
+        return self.conn.execute("SELECT MAX(created) FROM history WHERE puuid = ?", (puuid,)).fetchone()[0]
+
+    def history(self, puuid: str, count: int = 20) -> list[MatchRecord]:
+        '''
+        Returns a player's latest matches from history, newest first.
+        '''
+        rows = self.conn.execute("SELECT match_id FROM history WHERE puuid = ? ORDER BY created DESC LIMIT ?", (puuid, count)).fetchall()
+        return list(filter(None, [self.get(matchId) for matchId, in rows]))
+
+    def participants(self, puuid: str, count: int) -> list[tuple]:
+        '''
+        Returns a player's participant rows (laid out as `FIELDS`) of their latest `count` matches in history.
+        '''
+        return self.conn.execute(f"SELECT {', '.join(FIELDS)} FROM participants WHERE puuid = ? ORDER BY created DESC LIMIT ?", (puuid, count)).fetchall()
+
+    def backfill(self):
+        '''
+        Derive missing participant rows from matches already in history.
+        '''
+        missing = self.conn.execute("""
+            SELECT history.puuid, history.match_id FROM history
+            LEFT JOIN participants USING (puuid, match_id) WHERE participants.match_id IS NULL
+        """).fetchall()
+
+        rows = []
+        for puuid, matchId in missing:
+            if (match := self.get(matchId)) and (row := participant_row(puuid, match)):
+                rows.append((puuid, matchId, *row))
+
+        with self.conn:
+            self.conn.executemany(INSERT_PARTICIPANT, rows)
+
+    def stats(self) -> dict:
+        '''
+        Returns the number of stored matches, their compressed size and hit/miss counts.
+        '''
+        return {'matches': len(self), 'size': self.size, 'budget': self.budget, 'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,122 @@
+import time
+import bisect
+import asyncio
+import traceback
+
+import modules.riot_tools as riot
+from modules.riot_client import BACKGROUND
+
+TIERS = ["IRON", "BRONZE", "SILVER", "GOLD", "PLATINUM", "EMERALD", "DIAMOND", "MASTER", "GRANDMASTER", "CHALLENGER"]
+DIVISIONS = ["IV", "III", "II", "I"]
+QUEUE = "RANKED_SOLO_5x5"
+
+# seconds between bulk refreshes, concurrent players per refresh (requests still pass the rate limit governor)
+INTERVAL = 900
+CONCURRENCY = 10
+
+class RankLadder():
+    '''
+    Solo queue rank index of the registered players.
+
+    Players are kept sorted by (tier, division, LP) in a list maintained with `bisect`, so a rank change is one
+    removal and one insertion and rendering the ladder is a slice.\n
+    A bulk refresher fetches every player's ranked entries concurrently at `BACKGROUND` priority every `INTERVAL`.
+    '''
+    def __init__(self, players, interval: float = INTERVAL, clock = time.time):
+        self.players = players      # players() -> {puuid: platform or None} of the registered players
+        self.interval = interval
+        self.clock = clock
+
+        self.entries: dict[str, dict] = {}          # puuid -> entry
+        self.order: list[tuple[tuple, str]] = []    # (sort key, puuid), best first
+        self.refreshed = 0.0
+        self.task: asyncio.Task | None = None
+        self.refreshing: asyncio.Task | None = None
+
+    def __len__(self):
+        return len(self.order)
+
+    def start(self):
+        if not self.task:
+            self.task = asyncio.create_task(self.run())
+
+    def stop(self):
+        for task in (self.task, self.refreshing):
+            if task:
+                task.cancel()
+        self.task = self.refreshing = None
+
+    async def run(self):
+        while True:
+            await self.refresh()
+            await asyncio.sleep(self.interval)
+
+    def update(self, puuid: str, entry: dict | None):
+        '''
+        Set (or with `None`, remove) a player's entry, keeping the index sorted.
+        '''
+        if old := self.entries.pop(puuid, None):
+            i = bisect.bisect_left(self.order, (sort_key(old), puuid))
+            del self.order[i]
+
+        if entry:
+            self.entries[puuid] = entry
+            bisect.insort(self.order, (sort_key(entry), puuid))
+
+    def ranking(self, puuids: set[str] = None) -> list[tuple[str, dict]]:
+        '''
+        Returns (puuid, entry) best first, optionally only for `puuids`.
+        '''
+        return [(puuid, self.entries[puuid]) for _, puuid in self.order if puuids == None or puuid in puuids]
+
+    def refresh(self) -> asyncio.Task:
+        '''
+        Start a bulk refresh unless one is running. Returns the running refresh.
+        '''
+        if not self.refreshing or self.refreshing.done():
+            self.refreshing = asyncio.create_task(self.refresh_all())
+        return self.refreshing
+
+    async def refresh_all(self):
+        players = self.players()
+        semaphore = asyncio.Semaphore(CONCURRENCY)
+
+        async def refresh(puuid: str, platform: str | None):
+            async with semaphore:
+                try:
+                    await self.refresh_one(puuid, platform)
+                except Exception:
+                    traceback.print_exc()
+
+        await asyncio.gather(*[refresh(puuid, platform) for puuid, platform in players.items()])
+
+        # unregistered players
+        for puuid in set(self.entries) - set(players):
+            self.update(puuid, None)
+
+        self.refreshed = self.clock()
+
+    async def refresh_one(self, puuid: str, platform: str = None):
+        '''
+        Fetch a player's solo queue entry on `platform` (default: their region) and move them in the index.
+        '''
+        if not (summoner := await riot.get_summoner_by_puuid(puuid, platform, priority=BACKGROUND)):
+            return
+
+        if (stats := await riot.get_stats_by_summoner(summoner['id'], summoner['region'], priority=BACKGROUND, fresh=True)) == None:
+            return
+
+        if not (entry := next((entry for entry in stats if entry.get('queueType') == QUEUE), None)):
+            self.update(puuid, None)
+            return
+
+        self.update(puuid, {'name': f"{summoner['gameName']} #{summoner['tagLine']}", 'tier': entry['tier'], 'rank': entry['rank'],
+                            'lp': entry['leaguePoints'], 'wins': entry['wins'], 'losses': entry['losses']})
+
+def sort_key(entry: dict) -> tuple:
+    '''
+    Ascending sort key, best rank first.
+    '''
+    tier = TIERS.index(entry['tier']) if entry['tier'] in TIERS else -1
+    division = DIVISIONS.index(entry['rank']) if entry['rank'] in DIVISIONS else 0
+    return (-tier, -division, -entry['lp'], entry['name'].lower())
@@ -0,0 +1,155 @@
+import time
+import random
+import asyncio
+import traceback
+from collections import OrderedDict, deque
+
+import aiohttp
+import discord
+from discord.ext import commands
+
+WORKERS = 32
+RETRIES = 5
+BACKOFF = 1.0
+USER_TTL = 900
+USER_CACHE_SIZE = 10000
+
+class ReminderDelivery():
+    '''
+    Bounded worker pool that sends due reminders as DMs, one job per user.
+
+    Users and DM channels are kept in a TTL cache (checking `bot.get_user` before falling back to REST).\n
+    Sends are retried with exponential backoff on 429s, 5xx errors and connection errors.
+    '''
+    def __init__(self, bot: commands.Bot, render, done = None, workers: int = WORKERS, clock = time.time):
+        self.bot = bot
+        self.render = render        # render(user, reminders) -> list of send kwargs
+        self.done = done            # done(user_id, reminders, sent), `sent` is `None` if Discord rejected the messages
+        self.workers = workers
+        self.clock = clock
+
+        self.queue = asyncio.Queue()
+        self.tasks: list[asyncio.Task] = []
+        self.cache: OrderedDict[int, tuple] = OrderedDict()
+
+        self.delivered = 0
+        self.failed = 0
+        self.latency = deque(maxlen=1000)
+
+    def start(self):
+        '''
+        Start the workers.
+        '''
+        self.tasks = [asyncio.create_task(self.worker()) for _ in range(self.workers)]
+
+    def stop(self):
+        '''
+        Cancel the workers.
+        '''
+        for task in self.tasks:
+            task.cancel()
+        self.tasks = []
+
+    def enqueue(self, user_id: str, reminders: list[dict]):
+        '''
+        Queue a user's due reminders for delivery.
+        '''
+        self.queue.put_nowait((user_id, reminders))
+
+    def stats(self) -> dict:
+        '''
+        Returns queue depth, delivery counts and latency percentiles (seconds past due).
+        '''
+        latency = sorted(self.latency)
+
+        def percentile(p: float):
+            if latency:
+                return latency[min(len(latency) - 1, int(p * len(latency)))]
+
+        return {'queued': self.queue.qsize(), 'delivered': self.delivered, 'failed': self.failed,
+                'p50': percentile(0.50), 'p99': percentile(0.99), 'max': latency[-1] if latency else None}
+
+    async def get_channel(self, user_id: int) -> tuple[discord.User, discord.DMChannel]:
+        '''
+        Returns the user and their DM channel, from cache when possible.
+        '''
+        now = self.clock()
+
+        if (cached := self.cache.get(user_id)) and cached[0] > now:
+            self.cache.move_to_end(user_id)
+            return cached[1], cached[2]
+
+        if not (user := self.bot.get_user(user_id)):
+            user = await self.bot.fetch_user(user_id)
+
+        channel = user.dm_channel or await user.create_dm()
+
+        self.cache[user_id] = (now + USER_TTL, user, channel)
+        self.cache.move_to_end(user_id)
+        while len(self.cache) > USER_CACHE_SIZE:
+            self.cache.popitem(last=False)
+
+        return user, channel
+
+    async def worker(self):
+        while True:
+            user_id, reminders = await self.queue.get()
+            try:
+                try:
+                    sent = await self.deliver(user_id, reminders)
+                except Exception:
+                    traceback.print_exc()
+                    sent = None
+
+                if sent:
+                    self.delivered += len(reminders)
+                    self.latency.append(self.clock() - min(reminder['time'].timestamp() for reminder in reminders))
+                else:
+                    self.failed += len(reminders)
+
+                # e.g. the store being locked must not take the worker down with it
+                if self.done:
+                    self.done(user_id, reminders, sent)
+            except Exception:
+                traceback.print_exc()
+            finally:
+                self.queue.task_done()
+
+    async def deliver(self, user_id: str, reminders: list[dict]) -> bool | None:
+        '''
+        Send a user's reminders, retrying transient failures.
+
+        Returns
+            :class:`bool`: whether the reminders were sent, `None` if Discord rejected the rendered messages (400).
+        '''
+        messages = None
+        for attempt in range(RETRIES):
+            try:
+                user, channel = await self.get_channel(int(user_id))
+
+                # render once, pop messages as they are sent so retries resume
+                if messages == None:
+                    messages = self.render(user, reminders)
+
+                while messages:
+                    await channel.send(**messages[0])
+                    messages.pop(0)
+
+                return True
+
+            except discord.HTTPException as e:
+                if e.status == 404:
+                    self.cache.pop(int(user_id), None)
+                if e.status == 400:
+                    traceback.print_exc()
+                    return None
+                if e.status != 429 and e.status < 500:
+                    return False
+                delay = getattr(e, 'retry_after', None) or BACKOFF * 2**attempt
+
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                delay = BACKOFF * 2**attempt
+
+            await asyncio.sleep(delay * random.uniform(1, 1.25))
+
+        return False
@@ -0,0 +1,136 @@
+import time
+import heapq
+import asyncio
+import itertools
+import traceback
+
+# upper bound on a single sleep so wall clock adjustments are picked up
+MAX_SLEEP = 60
+
+# shared store: how often other instances' reminders are picked up, how long a claim lasts, how many rows per claim
+POLL_INTERVAL = 5
+LEASE = 300
+CLAIM_LIMIT = 200
+
+class ReminderScheduler():
+    '''
+    Global min-heap of pending reminders ordered by due time.
+
+    Sleeps until the earliest reminder is due and wakes early whenever the head of the heap changes.\n
+    Push is O(log n), remove is O(1) (entries are invalidated and skipped when they reach the head).
+    '''
+    def __init__(self, clock = time.time):
+        self.clock = clock
+        self.max_sleep = MAX_SLEEP
+        self.heap: list[list] = []      # [due, seq, user_id, reminder]
+        self.entries: dict[int, list] = {}
+        self.counter = itertools.count()
+        self.wakeup = asyncio.Event()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def push(self, user_id: str, reminder: dict):
+        '''
+        Schedule a reminder.
+        '''
+        due = reminder['time'].timestamp()
+        entry = [due, next(self.counter), user_id, reminder]
+
+        self.entries[id(reminder)] = entry
+        heapq.heappush(self.heap, entry)
+
+        # new head, wake up early
+        if self.heap[0] is entry:
+            self.wakeup.set()
+
+    def remove(self, reminder: dict):
+        '''
+        Unschedule a reminder.
+        '''
+        if not (entry := self.entries.pop(id(reminder), None)):
+            return
+
+        entry[-1] = None
+
+        # head removed, wake up to recompute the sleep
+        if self.heap[0] is entry:
+            self.wakeup.set()
+
+    def peek(self) -> float | None:
+        '''
+        Returns the due time of the earliest reminder.
+        '''
+        while self.heap and self.heap[0][-1] is None:
+            heapq.heappop(self.heap)
+
+        if self.heap:
+            return self.heap[0][0]
+
+    def pop_due(self, now: float) -> list[tuple[str, dict]]:
+        '''
+        Removes and returns every reminder due at or before `now`.
+
+        Returns
+            :class:`list`: list of (user_id, reminder) in due order.
+        '''
+        due = []
+        while (head := self.peek()) is not None and head <= now:
+            _, _, user_id, reminder = heapq.heappop(self.heap)
+            del self.entries[id(reminder)]
+            due.append((user_id, reminder))
+
+        return due
+
+    async def run(self, callback):
+        '''
+        Awaits `callback(due)` with every reminder that has come due, as a list of (user_id, reminder). Runs forever.
+        '''
+        while True:
+            self.wakeup.clear()
+
+            if (head := self.peek()) is None:
+                delay = self.max_sleep
+            else:
+                delay = min(head - self.clock(), self.max_sleep)
+
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            try:
+                await callback(self.pop_due(self.clock()))
+            except Exception:
+                traceback.print_exc()
+
+class SharedReminderScheduler(ReminderScheduler):
+    '''
+    Scheduler for a reminder store shared by several bot instances.
+
+    Due reminders are claimed from the store under an expiring lease, so each one is handed to a single instance and
+    picked up again by any instance if its owner dies before deleting it.\n
+    Local changes wake the scheduler immediately, changes made by other instances are seen within `POLL_INTERVAL`.
+    '''
+    def __init__(self, store, owner: str, clock = time.time):
+        super().__init__(clock=clock)
+        self.store = store
+        self.owner = owner
+        self.max_sleep = POLL_INTERVAL
+
+    def __len__(self):
+        return self.store.count()
+
+    def push(self, user_id: str, reminder: dict):
+        self.wakeup.set()
+
+    def remove(self, reminder: dict):
+        pass
+
+    def peek(self) -> float | None:
+        return self.store.next_due(self.clock())
+
+    def pop_due(self, now: float) -> list[tuple[str, dict]]:
+        return self.store.claim(self.owner, now, LEASE, CLAIM_LIMIT)
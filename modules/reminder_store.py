@@ -0,0 +1,348 @@
+import os
+import json
+import bisect
+import sqlite3
+import datetime
+from operator import itemgetter
+
+SCHEMA_VERSION = 5
+
+# migrations[v] upgrades a database from version v-1 to v
+MIGRATIONS = {
+    # untyped layout (unversioned databases already have it)
+    1: '''
+    CREATE TABLE IF NOT EXISTS reminders (
+        id       INTEGER PRIMARY KEY,
+        user_id  INTEGER NOT NULL,
+        time     INTEGER NOT NULL,
+        task     TEXT NOT NULL,
+        url      TEXT NOT NULL,
+        created  INTEGER NOT NULL,
+        modified INTEGER NOT NULL
+    );
+    ''',
+
+    # strictly typed columns, epoch seconds for every timestamp
+    2: '''
+    CREATE TABLE reminders_v2 (
+        id       INTEGER PRIMARY KEY,
+        user_id  INTEGER NOT NULL,
+        time     INTEGER NOT NULL,
+        task     TEXT NOT NULL,
+        url      TEXT NOT NULL,
+        created  INTEGER NOT NULL,
+        modified INTEGER NOT NULL
+    ) STRICT;
+    INSERT INTO reminders_v2 SELECT id, user_id, time, task, url, created, modified FROM reminders;
+    DROP TABLE reminders;
+    ALTER TABLE reminders_v2 RENAME TO reminders;
+    CREATE INDEX reminders_time ON reminders (time);
+    CREATE INDEX reminders_user_time ON reminders (user_id, time);
+    ''',
+
+    # delivery leases for instances sharing the database
+    3: '''
+    ALTER TABLE reminders ADD COLUMN lease_owner TEXT;
+    ALTER TABLE reminders ADD COLUMN lease_expires INTEGER;
+    CREATE INDEX reminders_lease ON reminders (lease_expires) WHERE lease_expires IS NOT NULL;
+    ''',
+
+    # recurrence rule, `time` holds the next occurrence
+    4: '''
+    ALTER TABLE reminders ADD COLUMN repeat TEXT;
+    ''',
+
+    # covering indexes for next_due and claim, which filter on the lease as well as the time
+    5: '''
+    CREATE INDEX reminders_time_lease ON reminders (time, lease_expires);
+    DROP INDEX reminders_time;
+    CREATE INDEX reminders_lease_time ON reminders (lease_expires, time) WHERE lease_expires IS NOT NULL;
+    DROP INDEX reminders_lease;
+    ''',
+}
+
+COLUMNS = "id, user_id, time, task, url, created, modified, repeat"
+
+# lease of reminders Discord rejected: they keep their row but are never claimed or loaded again
+REJECTED = "rejected"
+DEAD = 2**62
+INSERT = "INSERT INTO reminders (user_id, time, task, url, created, modified, repeat) VALUES (?, ?, ?, ?, ?, ?, ?)"
+
+# insert unless the user already has a reminder with the same creation time and task
+INSERT_NEW = '''
+    INSERT INTO reminders (user_id, time, task, url, created, modified, repeat) SELECT ?, ?, ?, ?, ?, ?, ?
+    WHERE NOT EXISTS (SELECT 1 FROM reminders WHERE user_id = ? AND created = ? AND task = ?)
+'''
+
+# local utc offsets, cached per quarter hour (dst transitions fall on quarter hours)
+OFFSETS: dict[int, datetime.tzinfo] = {}
+
+def to_epoch(date: datetime.datetime) -> int:
+    return round(date.timestamp())
+
+def from_epoch(epoch: int) -> datetime.datetime:
+    if not (tz := OFFSETS.get(quarter := epoch // 900)):
+        tz = OFFSETS[quarter] = datetime.datetime.fromtimestamp(quarter * 900).astimezone().tzinfo
+    return datetime.datetime.fromtimestamp(epoch, tz)
+
+def from_legacy(reminder: dict) -> dict:
+    '''
+    Converts a reminder from the legacy `reminders.json` layout (datetimes written with `str()`).
+    '''
+    for key in ('time', 'created', 'modified'):
+        reminder[key] = datetime.datetime.fromisoformat(reminder[key])
+    return reminder
+
+class ReminderList():
+    '''
+    A user's reminders, kept sorted by time.
+
+    Inserts and lookups bisect on the due time. The most recently touched reminder is tracked in insertion order, so
+    the no-argument forms of `/info` and `/rm` do not have to scan.
+    '''
+    def __init__(self, reminders: list[dict] = ()):
+        self.items = sorted(reminders, key=itemgetter('time'))
+        self.keys = [reminder['time'] for reminder in self.items]
+        self.touched = {id(reminder): reminder for reminder in sorted(self.items, key=itemgetter('modified'))}
+
+    def __len__(self):
+        return len(self.items)
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __getitem__(self, index: int) -> dict:
+        return self.items[index]
+
+    def add(self, reminder: dict):
+        '''
+        Inserts a reminder in time order and marks it as most recently touched.
+        '''
+        i = bisect.bisect_right(self.keys, reminder['time'])
+        self.items.insert(i, reminder)
+        self.keys.insert(i, reminder['time'])
+        self.touched[id(reminder)] = reminder
+
+    def index(self, reminder: dict) -> int:
+        '''
+        Returns the position of a reminder.
+        '''
+        i = bisect.bisect_left(self.keys, reminder['time'])
+        while self.items[i] is not reminder:
+            i += 1
+        return i
+
+    def remove(self, reminder: dict):
+        '''
+        Removes a reminder.
+        '''
+        self.pop([self.index(reminder)])
+
+    def move(self, reminder: dict, time: datetime.datetime):
+        '''
+        Changes the time of a reminder, keeping the list sorted.
+        '''
+        i = self.index(reminder)
+        del self.items[i]
+        del self.keys[i]
+
+        reminder['time'] = time
+        i = bisect.bisect_right(self.keys, time)
+        self.items.insert(i, reminder)
+        self.keys.insert(i, time)
+
+    def pop(self, indexes: list[int]) -> list[dict]:
+        '''
+        Removes reminders by (0-based) position.
+
+        O(n) however many are removed: one list deletion for a single reminder, otherwise one rebuild pass.
+
+        Returns
+            :class:`list`: the removed reminders, in the order of `indexes`.
+        '''
+        reminders = [self.items[i] for i in indexes]
+
+        if len(drop := {i % len(self.items) for i in indexes}) == 1:
+            i = drop.pop()
+            del self.items[i]
+            del self.keys[i]
+        elif drop:
+            self.items = [reminder for i, reminder in enumerate(self.items) if i not in drop]
+            self.keys = [reminder['time'] for reminder in self.items]
+
+        for reminder in reminders:
+            self.touched.pop(id(reminder), None)
+
+        return reminders
+
+    def touch(self, reminder: dict, now: datetime.datetime):
+        '''
+        Updates the modified time of a reminder and marks it as most recently touched.
+        '''
+        reminder['modified'] = now
+        self.touched.pop(id(reminder), None)
+        self.touched[id(reminder)] = reminder
+
+    def recent(self) -> dict | None:
+        '''
+        Returns the most recently touched reminder.
+        '''
+        if self.touched:
+            return self.touched[next(reversed(self.touched))]
+
+class ReminderStore():
+    '''
+    SQLite (WAL mode) reminder storage.
+
+    Every write touches a single row, so the cost of a command no longer depends on the total number of reminders.\n
+    Several bot instances can share one database: due reminders are handed out with `claim`, which leases them to a
+    single instance until they are deleted or the lease expires.
+    '''
+    def __init__(self, path: str):
+        self.conn = sqlite3.connect(path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.migrate()
+
+    def close(self):
+        self.conn.close()
+
+    def migrate(self):
+        '''
+        Upgrades the database to `SCHEMA_VERSION`.
+        '''
+        with self.conn:
+            # take the write lock first, so instances sharing the database migrate once
+            self.conn.execute("BEGIN IMMEDIATE")
+            version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+
+            for version in range(version + 1, SCHEMA_VERSION + 1):
+                for statement in MIGRATIONS[version].split(';'):
+                    self.conn.execute(statement)
+                self.conn.execute(f"PRAGMA user_version = {version}")
+
+    def load(self) -> dict[str, ReminderList]:
+        '''
+        Returns every reminder grouped by user, ordered by time.
+        '''
+        db = {}
+        for id, user_id, time, task, url, created, modified, repeat in self.conn.execute(f"SELECT {COLUMNS} FROM reminders WHERE lease_expires IS NOT ? ORDER BY user_id, time", (DEAD,)):
+            if (user := db.get(user_id)) == None:
+                user = db[user_id] = []
+            created_dt = from_epoch(created)
+            user.append({'id': id, 'time': from_epoch(time), 'task': task, 'url': url, 'created': created_dt,
+                         'modified': created_dt if modified == created else from_epoch(modified), 'repeat': repeat})
+        return {str(user_id): ReminderList(reminders) for user_id, reminders in db.items()}
+
+    def load_user(self, user_id: int | str) -> ReminderList:
+        '''
+        Returns a user's reminders.
+        '''
+        rows = self.conn.execute(f"SELECT {COLUMNS} FROM reminders WHERE user_id = ? AND lease_expires IS NOT ? ORDER BY time", (int(user_id), DEAD))
+        return ReminderList([to_reminder(row) for row in rows])
+
+    def count(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM reminders WHERE lease_expires IS NOT ?", (DEAD,)).fetchone()[0]
+
+    def next_due(self, now: float) -> float | None:
+        '''
+        Returns the earliest time a reminder can be claimed (its due time, or when its lease expires).
+        '''
+        unleased = self.conn.execute("SELECT MIN(time) FROM reminders WHERE lease_expires IS NULL").fetchone()[0]
+        leased = self.conn.execute("SELECT MIN(MAX(time, lease_expires)) FROM reminders WHERE lease_expires IS NOT NULL AND lease_expires < ?", (DEAD,)).fetchone()[0]
+
+        if (times := [time for time in (unleased, leased) if time != None]):
+            return min(times)
+
+    def claim(self, owner: str, now: float, lease: int, limit: int) -> list[tuple[str, dict]]:
+        '''
+        Atomically leases up to `limit` due reminders that are not leased by another instance.
+
+        Returns
+            :class:`list`: list of (user_id, reminder) in due order.
+        '''
+        with self.conn:
+            rows = self.conn.execute(f'''
+                UPDATE reminders SET lease_owner = ?, lease_expires = ?
+                WHERE id IN (SELECT id FROM reminders WHERE time <= ? AND (lease_expires IS NULL OR lease_expires <= ?) ORDER BY time LIMIT ?)
+                RETURNING {COLUMNS}
+            ''', (owner, int(now) + lease, int(now), int(now), limit)).fetchall()
+
+        return [(str(row[1]), to_reminder(row)) for row in sorted(rows, key=itemgetter(2))]
+
+    def insert(self, user_id: int | str, reminder: dict) -> int:
+        '''
+        Inserts a reminder and stores its row id in `reminder['id']`.
+        '''
+        with self.conn:
+            cursor = self.conn.execute(INSERT, to_row(user_id, reminder))
+
+        reminder['id'] = cursor.lastrowid
+        return reminder['id']
+
+    def touch(self, reminder: dict):
+        '''
+        Writes the modified field of a reminder (and nothing else another instance may be changing).
+        '''
+        with self.conn:
+            self.conn.execute("UPDATE reminders SET modified = ? WHERE id = ?", (to_epoch(reminder['modified']), reminder['id']))
+
+    def reschedule(self, reminder: dict):
+        '''
+        Moves a recurring reminder to its next occurrence and releases its lease.
+        '''
+        with self.conn:
+            self.conn.execute("UPDATE reminders SET time = ?, lease_owner = NULL, lease_expires = NULL WHERE id = ?",
+                              (to_epoch(reminder['time']), reminder['id']))
+
+    def delete(self, reminders: list[dict]):
+        '''
+        Deletes reminders.
+        '''
+        with self.conn:
+            self.conn.executemany("DELETE FROM reminders WHERE id = ?", [(reminder['id'],) for reminder in reminders])
+
+    def reject(self, reminders: list[dict]):
+        '''
+        Parks reminders Discord permanently rejected: the rows are kept but never claimed or loaded again.
+        '''
+        with self.conn:
+            self.conn.executemany("UPDATE reminders SET lease_owner = ?, lease_expires = ? WHERE id = ?",
+                                  [(REJECTED, DEAD, reminder['id']) for reminder in reminders])
+
+    def migrate_json(self, path: str) -> int:
+        '''
+        One-shot import of a legacy `reminders.json`.
+
+        The file is renamed to `{path}.migrated` once the import is committed. Reminders already in the database
+        (same user, creation time and task) are skipped, so an import interrupted before the rename can be re-run.
+
+        Returns
+            :class:`int`: number of reminders imported.
+        '''
+        if not os.path.exists(path):
+            return 0
+
+        with self.conn:
+            # take the write lock first, so instances sharing the database import it once
+            self.conn.execute("BEGIN IMMEDIATE")
+
+            if not os.path.exists(path):
+                return 0
+
+            with open(path, 'r') as f:
+                legacy = json.load(f)
+
+            rows = [to_row(user_id, from_legacy(reminder)) for user_id in legacy for reminder in legacy[user_id]]
+            cursor = self.conn.executemany(INSERT_NEW, [row + (row[0], row[4], row[2]) for row in rows])
+
+        # only after the commit: if it failed the file is still there for the next start
+        os.replace(path, path + ".migrated")
+
+        return cursor.rowcount
+
+def to_row(user_id: int | str, reminder: dict) -> tuple:
+    return (int(user_id), to_epoch(reminder['time']), reminder['task'], reminder['url'], to_epoch(reminder['created']), to_epoch(reminder['modified']), reminder.get('repeat'))
+
+def to_reminder(row: tuple) -> dict:
+    return {'id': row[0], 'time': from_epoch(row[2]), 'task': row[3], 'url': row[4], 'created': from_epoch(row[5]), 'modified': from_epoch(row[6]), 'repeat': row[7]}
@@ -3,179 +3,304 @@ import datetime
 from datetime import timedelta
 from dateutil.relativedelta import relativedelta
 
-now : datetime.datetime = None
+UNITS = {
+    'am': 'am',
+    'a':  'am',
+    'pm': 'pm',
+    'p':  'pm',
+
+    'jan': 1,
+    'feb': 2,
+    'mar': 3,
+    'apr': 4,
+    'may': 5,
+    'jun': 6,
+    'jul': 7,
+    'aug': 8,
+    'sep': 9,
+    'oct': 10,
+    'nov': 11,
+    'dec': 12,
+
+    'mon': 0,
+    'tue': 1,
+    'wed': 2,
+    'thu': 3,
+    'fri': 4,
+    'sat': 5,
+    'sun': 6
+}
+
+TIMEDELTA_UNITS = {
+    's':  'seconds',
+    'm':  'minutes',
+    'h':  'hours',
+    'd':  'days',
+    'w':  'weeks',
+    'mo': 'months',
+    'y':  'years',
+}
 
-def parse_time(string: str):
+class TimeParser():
     '''
-    Parses a string containing a date/time/timedelta.
+    Parses strings containing a date/time/timedelta.
 
-    Returns
-        :class:`datetime`: time relative to the reference time.
-        :class:`string`: remaining string.
+    The grammar is compiled once and the reference time is passed to every call, so one instance can be shared between threads.
     '''
-    global now 
-    now = datetime.datetime.now(datetime.timezone.utc).astimezone()
+    def __init__(self):
+        self.timedelta_pattern = re.compile(r"\s*(?:in\s?)?(\d+\.?\d?)(y|mo|w|d|h|m|s)\s*", flags=re.I)
+        self.time_pattern = re.compile(r"\s*(?:at\s?)?(1[0-2]|[0-9])(?::([0-5][0-9]))?\s?(am|a|pm|p)?\s*", flags=re.I)
+        self.date_pattern = re.compile(r"\s*(?:on\s?)?(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\s?(3[0-1]|[0-2]?[0-9])(?:[,\s]*(\d{4}))?\s*", flags=re.I)
+        self.weekday_pattern = re.compile(r"\s*(?:on\s?)?(mon|tue|wed|thu|fri|sat|sun|tmr|tom)[a-z]*\s*", flags=re.I)
+        self.repeat_pattern = re.compile(r"\s*every\s+", flags=re.I)
+
+    def parse_time(self, string: str, now: datetime.datetime = None):
+        '''
+        Parses a string containing a date/time/timedelta.
+
+        Returns
+            :class:`datetime`: time relative to `now` (default: current time).
+            :class:`string`: remaining string.
+        '''
+        if now == None:
+            now = datetime.datetime.now(datetime.timezone.utc).astimezone()
+
+        time_dict = {'month': None, 'day': None, 'year': None, 'hour': None, 'minute': None, 'period': None, 'weekday': None}
+
+        # match timedelta
+        if match := self.match_timedelta(string):
+            return now + match[0], match[1].replace('\n', ' ').strip()
+
+        # match date/time/weekday
+        while (match := self.match_date(string)) or (match := self.match_time(string)) or (match := self.match_weekday(string, now)):
+            time_dict.update(match[0])
+            string = match[1]
+
+        # if date/time/weekday was matched
+        if not all(value == None for value in time_dict.values()):
+            date = interpret_time(**time_dict, now=now)
 
-    time_dict = {'month': None, 'day': None, 'year': None, 'hour': None, 'minute': None, 'period': None, 'weekday': None}
+        else:
+            raise ValueError("Invalid string format.")
+
+        return date, string.replace('\n', ' ').strip()
+
+    def parse_many(self, strings: list[str], now: datetime.datetime = None) -> list[tuple | None]:
+        '''
+        Parses every string against the same reference time.
+
+        Returns
+            :class:`list`: `(datetime, string)` for each string, `None` where the string is invalid.
+        '''
+        if now == None:
+            now = datetime.datetime.now(datetime.timezone.utc).astimezone()
+
+        parsed = []
+        for string in strings:
+            try:
+                parsed.append(self.parse_time(string, now))
+            except (ValueError, OverflowError):
+                parsed.append(None)
+
+        return parsed
+
+    def parse_reminder(self, string: str, now: datetime.datetime = None):
+        '''
+        Parses a one-shot (`{when} {task}`) or recurring (`every {when} {task}`) reminder.
+
+        Returns
+            :class:`datetime`: (first) occurrence relative to `now` (default: current time).
+            :class:`string`: rule, `None` if the reminder does not repeat.
+            :class:`string`: remaining string.
+        '''
+        if self.repeat_pattern.match(string):
+            return self.parse_repeat(string, now)
+
+        date, task = self.parse_time(string, now)
+        return date, None, task
+
+    def parse_repeat(self, string: str, now: datetime.datetime = None):
+        '''
+        Parses a string containing a recurring date/time/timedelta: `every {when} {task}`.
+
+        Returns
+            :class:`datetime`: first occurrence relative to `now` (default: current time).
+            :class:`string`: rule (the `{when}` part).
+            :class:`string`: remaining string.
+        '''
+        if not (match := self.repeat_pattern.match(string)):
+            raise ValueError("Invalid string format.")
+
+        string = string[match.end():].strip()
+        date, task = self.parse_time(string, now)
+
+        return date, string[:len(string) - len(task)].strip(), task
+
+    def next_occurrence(self, rule: str, after: datetime.datetime) -> datetime.datetime | None:
+        '''
+        Returns the first occurrence of a rule after `after`, or `None` if it does not repeat (or the next one cannot
+        be represented, e.g. `every feb 29` in a common year or past year 9999).
+        '''
+        try:
+            date, _ = self.parse_time(rule, after)
+        except (ValueError, OverflowError):
+            return None
+
+        if date > after:
+            return date
+
+    def occurrences(self, rule: str, start: datetime.datetime):
+        '''
+        Lazily yields `start` and every following occurrence of a rule.
+        '''
+        date = start
+        while date:
+            yield date
+            date = self.next_occurrence(rule, date)
+
+    def match_timedelta(self, string: str):
+        '''
+        If timedelta is found at beginning of string:
+            return tuple( `timedelta`, `remaining string` )
+        Else:
+            return `None`
+        '''
+        if self.timedelta_pattern.match(string):
+            delta = timedelta()
+            while match := self.timedelta_pattern.match(string):
+                delta += to_timedelta(*match.groups())
+                string = string[match.end():]
+
+            return delta, string.replace('\n', ' ').strip()
 
-    # match timedelta
-    if match := match_timedelta(string):
-        return now + match[0], match[1].replace('\n', ' ').strip()
-    
-    # match date/time/weekday
-    while (match := match_date(string)) or (match := match_time(string)) or (match := match_weekday(string)):
-        time_dict.update(match[0])
-        string = match[1]
+        else:
+            return None
+
+    def match_time(self, string: str):
+        '''
+        If time is found at beginning of string:
+            return tuple( `time_dict`, `remaining string` )
+        Else:
+            return `None`
+        '''
+        if (match := self.time_pattern.match(string)):
+            matched = [parse(m) for m in match.groups()]
+
+            # correct hour
+            if matched[0] == 12:
+                matched[0] = 0
+
+            time_dict = {i: j for i, j in zip(['hour', 'minute', 'period'], matched)}
+            string = string[match.end():]
 
-    # if date/time/weekday was matched
-    if not all(value == None for value in time_dict.values()):
-        date = interpret_time(**time_dict)
-        
-    else:
-        raise ValueError("Invalid string format.")
-    
-    return date, string.replace('\n', ' ').strip()
-
-def parse(string: str):
-    units = {
-        'am': 'am',
-        'a':  'am',
-        'pm': 'pm',
-        'p':  'pm',
-
-        'jan': 1,
-        'feb': 2,
-        'mar': 3,
-        'apr': 4,
-        'may': 5,
-        'jun': 6,
-        'jul': 7,
-        'aug': 8,
-        'sep': 9,
-        'oct': 10,
-        'nov': 11,
-        'dec': 12,
-
-        'mon': 0,
-        'tue': 1,
-        'wed': 2,
-        'thu': 3,
-        'fri': 4,
-        'sat': 5,
-        'sun': 6,
-
-        'tmr': now.weekday() + 1,
-        'tom': now.weekday() + 1
-    }
+            return time_dict, string
 
-    if string == None:
-        return string
-    elif string.isdigit():
-        return int(string)
-    else:
-        return units[string[:3].lower()]
+        else:
+            return None
+
+    def match_date(self, string: str):
+        '''
+        If date is found at beginning of string:
+            return tuple( `time_dict`, `remaining string` )
+        Else:
+            return `None`
+        '''
+        if (match := self.date_pattern.match(string)):
+            matched = [parse(m) for m in match.groups()]
+
+            time_dict = {i: j for i, j in zip(['month', 'day', 'year'], matched)}
+            string = string[match.end():]
 
-def match_timedelta(string: str):
-    '''
-    If timedelta is found at beginning of string:
-        return tuple( `timedelta`, `remaining string` )
-    Else:
-        return `None`
-    '''
-    timedelta_pattern = r"\s*(?:in\s?)?(\d+\.?\d?)(y|mo|w|d|h|m|s)\s*"
+            return time_dict, string
 
-    if re.match(timedelta_pattern, string, flags=re.I):
-        delta = timedelta()
-        while match := re.match(timedelta_pattern, string, flags=re.I):
-            delta += to_timedelta(*match.groups())
+        else:
+            return None
+
+    def match_weekday(self, string: str, now: datetime.datetime):
+        '''
+        If weekday is found at beginning of string:
+            return tuple( `time_dict`, `remaining string` )
+        Else:
+            return `None`
+        '''
+        if (match := self.weekday_pattern.match(string)):
+            time_dict = {'weekday': parse(match.groups()[0], now)}
             string = string[match.end():]
 
-        return delta, string.replace('\n', ' ').strip()
+            return time_dict, string
 
-    else:
-        return None
+        else:
+            return None
 
+parser = TimeParser()
 
-def match_time(string: str):
+def parse_time(string: str, now: datetime.datetime = None):
     '''
-    If time is found at beginning of string:
-        return tuple( `time_dict`, `remaining string` )
-    Else:
-        return `None`
-    '''
-    time_pattern = r"\s*(?:at\s?)?(1[0-2]|[0-9])(?::([0-5][0-9]))?\s?(am|a|pm|p)?\s*"
-
-    if (match := re.match(time_pattern, string, flags=re.I)):
-        matched = [parse(m) for m in match.groups()]
+    Parses a string containing a date/time/timedelta.
 
-        # correct hour
-        if matched[0] == 12:
-            matched[0] = 0
+    Returns
+        :class:`datetime`: time relative to `now` (default: current time).
+        :class:`string`: remaining string.
+    '''
+    return parser.parse_time(string, now)
 
-        time_dict = {i: j for i, j in zip(['hour', 'minute', 'period'], matched)}
-        string = string[match.end():]
+def parse_many(strings: list[str], now: datetime.datetime = None) -> list[tuple | None]:
+    '''
+    Parses every string against the same reference time.
+    '''
+    return parser.parse_many(strings, now)
 
-        return time_dict, string
-    
-    else:
-        return None
-    
-def match_date(string: str):
+def parse_reminder(string: str, now: datetime.datetime = None):
     '''
-    If date is found at beginning of string:
-        return tuple( `time_dict`, `remaining string` )
-    Else:
-        return `None`
+    Parses a one-shot (`{when} {task}`) or recurring (`every {when} {task}`) reminder.
+
+    Returns
+        :class:`datetime`: (first) occurrence relative to `now` (default: current time).
+        :class:`string`: rule, `None` if the reminder does not repeat.
+        :class:`string`: remaining string.
     '''
-    date_pattern = r"\s*(?:on\s?)?(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\s?(3[0-1]|[0-2]?[0-9])(?:[,\s]*(\d{4}))?\s*"
+    return parser.parse_reminder(string, now)
 
-    if (match := re.match(date_pattern, string, flags=re.I)):
-        matched = [parse(m) for m in match.groups()]
+def parse_repeat(string: str, now: datetime.datetime = None):
+    '''
+    Parses a string containing a recurring date/time/timedelta: `every {when} {task}`.
 
-        time_dict = {i: j for i, j in zip(['month', 'day', 'year'], matched)}
-        string = string[match.end():]
+    Returns
+        :class:`datetime`: first occurrence relative to `now` (default: current time).
+        :class:`string`: rule (the `{when}` part).
+        :class:`string`: remaining string.
+    '''
+    return parser.parse_repeat(string, now)
 
-        return time_dict, string
-    
-    else:
-        return None
-    
-def match_weekday(string: str):
+def next_occurrence(rule: str, after: datetime.datetime) -> datetime.datetime | None:
     '''
-    If weekday is found at beginning of string:
-        return tuple( `time_dict`, `remaining string` )
-    Else:
-        return `None`
+    Returns the first occurrence of a rule after `after`, or `None` if it does not repeat.
     '''
-    weekday_pattern = r"\s*(?:on\s?)?(mon|tue|wed|thu|fri|sat|sun|tmr|tom)[a-z]*\s*"
+    return parser.next_occurrence(rule, after)
 
-    if (match := re.match(weekday_pattern, string, flags=re.I)):
-        time_dict = {'weekday': parse(match.groups()[0])}
-        string = string[match.end():]
+def occurrences(rule: str, start: datetime.datetime):
+    '''
+    Lazily yields `start` and every following occurrence of a rule.
+    '''
+    return parser.occurrences(rule, start)
 
-        return time_dict, string
-    
+def parse(string: str, now: datetime.datetime = None):
+    if string == None:
+        return string
+    elif string.isdigit():
+        return int(string)
+    elif (unit := string[:3].lower()) in ('tmr', 'tom'):
+        return (now.weekday() + 1) % 7
     else:
-        return None
-    
+        return UNITS[unit]
+
 def to_timedelta(amount, unit):
     '''
     Returns a :class:`timedelta` | :class:`relativedelta` object.
 
     Valid units: [ y | mo | w | d | h | m | s]
     '''
-
-    units = {
-    's':  'seconds',
-    'm':  'minutes',
-    'h':  'hours',
-    'd':  'days',
-    'w':  'weeks',
-    'mo': 'months',
-    'y':  'years',
-    }
-
-    if (unit := units.get(unit.lower())) and (amount := to_float(amount)):
+    if (unit := TIMEDELTA_UNITS.get(unit.lower())) and (amount := to_float(amount)):
         if unit == 'months':
             return relativedelta(months=+int(amount), days=+int(30*(amount%1)))
         elif unit == 'years':
@@ -185,24 +310,26 @@ def to_timedelta(amount, unit):
 
     else:
         raise ValueError("Invalid unit.")
-    
-def interpret_time(month: int = None, day: int = None, year: int = None, 
-                   hour: int = None, minute: int = None, period: str = None, weekday: int = None):
+
+def interpret_time(month: int = None, day: int = None, year: int = None,
+                   hour: int = None, minute: int = None, period: str = None, weekday: int = None,
+                   now: datetime.datetime = None):
     '''
     Returns the earliest possible date with the given time information.
-    
-    Date is determined with respect to the current time.
+
+    Date is determined with respect to `now` (default: current time).
 
     If hour/minute/period is not given, default is 12:00 AM.
 
     Returns
-        :class:`datetime.datetime`: time relative to current time.
+        :class:`datetime.datetime`: time relative to `now`.
     '''
-    
-    loc = locals()
-    time_dict = {i: loc[i] for i in ('year', 'month', 'day', 'hour', 'minute')}
+    if now == None:
+        now = datetime.datetime.now(datetime.timezone.utc).astimezone()
 
-    date = midnight().replace(**{i: time_dict[i] for i in time_dict if time_dict[i] != None}) + relativedelta(weekday=weekday)
+    time_dict = {'year': year, 'month': month, 'day': day, 'hour': hour, 'minute': minute}
+
+    date = midnight(now).replace(**{i: time_dict[i] for i in time_dict if time_dict[i] != None}) + relativedelta(weekday=weekday)
 
     # apply corrections
     if period == 'am' and date.hour in range(12, 24):
@@ -211,8 +338,10 @@ def interpret_time(month: int = None, day: int = None, year: int = None,
         date += timedelta(hours=12)
 
     if date <= now:
-        if period == None and date + timedelta(hours=12) > now:
+        if period == None and hour != None and date + timedelta(hours=12) > now:
             date += timedelta(hours=12)
+        elif weekday != None:
+            date += timedelta(weeks=1)
         elif day == None and date + timedelta(days=1) > now:
             date += timedelta(days=1)
         elif month == None and date + relativedelta(months=+1) > now:
@@ -233,8 +362,8 @@ def to_float(string):
         return float(string)
     except:
         return None
-    
-def midnight():
+
+def midnight(now: datetime.datetime):
     return datetime.datetime.combine(now.date(), datetime.time(tzinfo=now.tzinfo))
 
 def time_diff(t1: datetime.time, t2: datetime.time):
@@ -242,4 +371,3 @@ def time_diff(t1: datetime.time, t2: datetime.time):
     Returns `t1` - `t2` as a :class:`timedelta`.
     '''
     return datetime.datetime.combine(datetime.date(1,1,1), t1) - datetime.datetime.combine(datetime.date(1,1,1), t2)
-    
\ No newline at end of file
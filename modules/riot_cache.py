@@ -0,0 +1,87 @@
+import time
+import asyncio
+import traceback
+from collections import OrderedDict
+
+from modules.riot_client import INTERACTIVE, BACKGROUND
+
+CACHE_SIZE = 10000
+
+class SWRCache():
+    '''
+    Stale-while-revalidate TTL cache for Riot API responses.
+
+    Entries younger than `ttl` are returned as is. Entries younger than `max_age` are returned immediately while a
+    background refresh (at `BACKGROUND` priority) replaces them. Older entries and misses are fetched in the
+    foreground.\n
+    `fetch(priority)` returns the value, or `None` if it should not be cached. Values are shared and must not be modified.
+    '''
+    def __init__(self, ttl: float, max_age: float, size: int = CACHE_SIZE, clock = time.monotonic):
+        self.ttl = ttl
+        self.max_age = max_age
+        self.size = size
+        self.clock = clock
+
+        self.entries: OrderedDict[object, tuple[float, object]] = OrderedDict()     # key -> (fetched, value)
+        self.refreshing: dict[object, asyncio.Task] = {}
+
+        self.hits = 0
+        self.stale = 0
+        self.misses = 0
+
+    async def get(self, key, fetch, priority: int = INTERACTIVE, fresh: bool = False):
+        '''
+        Returns the cached value of `key`, fetching it at `priority` on a miss (or if `fresh` and it is stale).
+        '''
+        if entry := self.entries.get(key):
+            fetched, value = entry
+            age = self.clock() - fetched
+
+            if age < self.ttl:
+                self.hits += 1
+                self.entries.move_to_end(key)
+                return value
+
+            if age < self.max_age and not fresh:
+                self.stale += 1
+                self.entries.move_to_end(key)
+                self.revalidate(key, fetch)
+                return value
+
+        self.misses += 1
+        if (value := await fetch(priority)) != None:
+            self.put(key, value)
+
+        return value
+
+    def revalidate(self, key, fetch):
+        '''
+        Refresh an entry in the background (once per key at a time).
+        '''
+        if key in self.refreshing:
+            return
+
+        task = self.refreshing[key] = asyncio.create_task(self.refresh(key, fetch))
+        task.add_done_callback(lambda _: self.refreshing.pop(key, None))
+
+    async def refresh(self, key, fetch):
+        try:
+            if (value := await fetch(BACKGROUND)) != None:
+                self.put(key, value)
+        except Exception:
+            traceback.print_exc()
+
+    def put(self, key, value):
+        self.entries[key] = (self.clock(), value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+    def invalidate(self, key):
+        self.entries.pop(key, None)
+
+    def stats(self) -> dict:
+        '''
+        Returns entry count and fresh hit / stale hit / miss counts.
+        '''
+        return {'entries': len(self.entries), 'hits': self.hits, 'stale': self.stale, 'misses': self.misses}
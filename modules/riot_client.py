@@ -0,0 +1,419 @@
+import time
+import heapq
+import asyncio
+import itertools
+import urllib.parse
+from collections import deque
+
+import aiohttp
+
+TIMEOUT = aiohttp.ClientTimeout(total=10, connect=3)
+POOL_SIZE = 20
+KEEPALIVE = 60
+
+# request priorities, lower goes first
+INTERACTIVE = 0
+BACKGROUND = 1
+
+# development key limits, replaced by the X-App-Rate-Limit header on the first response
+DEFAULT_APP_LIMITS = "20:1,100:120"
+
+# share of every app and method window background requests leave to interactive ones
+BACKGROUND_RESERVE = 0.2
+
+RETRIES = 3
+RETRY_AFTER = 1.0
+
+class Bucket():
+    '''
+    Sliding-window counters for one rate limit, e.g. `20:1,100:120` (20 requests per second, 100 per 2 minutes).
+    '''
+    def __init__(self, limits: str = ""):
+        self.limits: list[tuple[int, int, deque]] = []     # (count, window, request times)
+        self.blocked = 0.0
+        self.set_limits(limits)
+
+    def set_limits(self, limits: str):
+        limits = parse_limits(limits)
+        if [(count, window) for count, window, _ in self.limits] == limits:
+            return
+
+        hits = {window: times for _, window, times in self.limits}
+        self.limits = [(count, window, hits.get(window, deque())) for count, window in limits]
+
+    def sync(self, counts: str, now: float):
+        '''
+        Catch up with the counts Riot reports (requests made by other processes with the same key).
+        '''
+        counts = dict((window, count) for count, window in parse_limits(counts))
+        for _, window, times in self.limits:
+            while len(times) < counts.get(window, 0):
+                times.append(now)
+
+    def delay(self, now: float, reserve: float = 0) -> float:
+        '''
+        Returns how long until a request fits in every window, keeping a `reserve` share of each window free.
+        '''
+        delay = self.blocked - now
+        for count, window, times in self.limits:
+            while times and times[0] <= now - window:
+                times.popleft()
+
+            limit = max(1, count - int(count * reserve))
+            if len(times) >= limit:
+                delay = max(delay, times[len(times) - limit] + window - now)
+
+        return max(delay, 0)
+
+    def hit(self, now: float):
+        for _, _, times in self.limits:
+            times.append(now)
+
+    def block(self, until: float):
+        self.blocked = max(self.blocked, until)
+
+    def usage(self) -> list[tuple[int, int, int]]:
+        '''
+        Returns (used, count, window) for every window.
+        '''
+        return [(len(times), count, window) for count, window, times in self.limits]
+
+class Governor():
+    '''
+    Rate-limit governor for one routing host.
+
+    Tracks the app bucket and a bucket per method from Riot's rate limit headers and holds requests in a priority
+    queue until both buckets have room, so requests wait instead of failing with a 429.\n
+    Interactive requests go first and background requests leave `BACKGROUND_RESERVE` of the app and method buckets
+    free, so a burst of background work on a method (e.g. cache revalidations) cannot hold interactive requests for
+    that method back a whole window.
+    '''
+    def __init__(self, clock = time.monotonic):
+        self.clock = clock
+        self.app = Bucket(DEFAULT_APP_LIMITS)
+        self.methods: dict[str, Bucket] = {}
+        self.waiters: list[list] = []       # [priority, seq, method, future]
+        self.counter = itertools.count()
+        self.wakeup = asyncio.Event()
+        self.task: asyncio.Task | None = None
+
+        self.waits = {INTERACTIVE: deque(maxlen=1000), BACKGROUND: deque(maxlen=1000)}
+        self.requests = 0
+        self.throttled = 0
+
+    def method(self, method: str) -> Bucket:
+        if not (bucket := self.methods.get(method)):
+            bucket = self.methods[method] = Bucket()
+        return bucket
+
+    async def acquire(self, method: str, priority: int = INTERACTIVE, request: 'Request' = None):
+        '''
+        Wait for room in the app and method buckets. With a `request`, its priority is used and it can be promoted
+        while waiting.
+        '''
+        if request:
+            priority = request.priority
+
+        start = self.clock()
+        future = asyncio.get_running_loop().create_future()
+        entry = [priority, next(self.counter), method, future]
+        heapq.heappush(self.waiters, entry)
+
+        if request:
+            request.governor, request.entry = self, entry
+
+        if not self.task or self.task.done():
+            self.task = asyncio.create_task(self.dispatch())
+        else:
+            self.wakeup.set()
+
+        try:
+            await future
+        finally:
+            if request:
+                request.entry = None
+        self.waits[entry[0]].append(self.clock() - start)
+
+    def promote(self, entry: list, priority: int):
+        '''
+        Move a waiting request up to `priority`.
+        '''
+        if entry[0] > priority and not entry[3].done():
+            entry[0] = priority
+            heapq.heapify(self.waiters)
+            self.wakeup.set()
+
+    async def dispatch(self):
+        '''
+        Grant waiting requests in priority order as the buckets allow. Exits once the queue is empty.
+        '''
+        while self.waiters:
+            self.wakeup.clear()
+            now = self.clock()
+            delay = None
+
+            waiting = []
+            while self.waiters:
+                entry = heapq.heappop(self.waiters)
+                priority, _, method, future = entry
+                if future.done():
+                    continue
+                reserve = BACKGROUND_RESERVE if priority == BACKGROUND else 0
+
+                # app bucket is shared (and lower priorities keep a larger reserve), nothing behind this request fits either
+                if wait := self.app.delay(now, reserve):
+                    delay = min(delay or wait, wait)
+                    waiting.append(entry)
+                    break
+
+                # method buckets are independent, other methods may go ahead
+                if wait := self.method(method).delay(now, reserve):
+                    delay = min(delay or wait, wait)
+                    waiting.append(entry)
+                    continue
+
+                self.app.hit(now)
+                self.method(method).hit(now)
+                self.requests += 1
+                future.set_result(None)
+
+            for entry in waiting:
+                heapq.heappush(self.waiters, entry)
+
+            if self.waiters:
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+
+    def update(self, method: str, headers):
+        '''
+        Apply the limits and counts of a response.
+        '''
+        now = self.clock()
+
+        if limits := headers.get('X-App-Rate-Limit'):
+            self.app.set_limits(limits)
+            self.app.sync(headers.get('X-App-Rate-Limit-Count', ""), now)
+
+        if limits := headers.get('X-Method-Rate-Limit'):
+            self.method(method).set_limits(limits)
+            self.method(method).sync(headers.get('X-Method-Rate-Limit-Count', ""), now)
+
+    def throttle(self, method: str, headers):
+        '''
+        Block the bucket a 429 was for until its `Retry-After`.
+        '''
+        self.throttled += 1
+        until = self.clock() + to_float(headers.get('Retry-After'), RETRY_AFTER)
+
+        if headers.get('X-Rate-Limit-Type') == 'application':
+            self.app.block(until)
+        else:
+            self.method(method).block(until)
+
+        self.wakeup.set()
+
+    def stats(self) -> dict:
+        '''
+        Returns queue depth, request counts, app bucket usage and queue wait percentiles (seconds) per priority.
+        '''
+        def percentile(waits: list[float], p: float):
+            if waits:
+                return waits[min(len(waits) - 1, int(p * len(waits)))]
+
+        stats = {'queued': sum(not future.done() for *_, future in self.waiters), 'requests': self.requests,
+                 'throttled': self.throttled, 'app': self.app.usage()}
+
+        for priority, name in ((INTERACTIVE, 'interactive'), (BACKGROUND, 'background')):
+            waits = sorted(self.waits[priority])
+            stats[name] = {'p50': percentile(waits, 0.50), 'p99': percentile(waits, 0.99), 'max': waits[-1] if waits else None}
+
+        return stats
+
+class Request():
+    '''
+    Priority of a request that may be shared by several callers, raised when a more urgent caller joins it.
+    '''
+    __slots__ = ('priority', 'governor', 'entry')
+
+    def __init__(self, priority: int):
+        self.priority = priority
+        self.governor: Governor | None = None
+        self.entry: list | None = None      # governor queue entry while waiting
+
+    def promote(self, priority: int):
+        if priority < self.priority:
+            self.priority = priority
+            if self.entry:
+                self.governor.promote(self.entry, priority)
+
+class SingleFlight():
+    '''
+    Coalesces identical in-flight calls: callers of a key already being fetched await the same task.
+
+    A caller joining with a higher priority promotes the call in flight, so an interactive caller never waits at
+    background priority. Results are shared between callers and must not be modified.
+    '''
+    def __init__(self):
+        self.calls: dict[tuple, tuple[asyncio.Task, Request]] = {}
+        self.coalesced = 0
+
+    async def do(self, key: tuple, fn, priority: int = INTERACTIVE):
+        '''
+        Returns `await fn(request)`, or the result of the call already in flight for `key`.
+        '''
+        if call := self.calls.get(key):
+            self.coalesced += 1
+            task, request = call
+            request.promote(priority)
+        else:
+            request = Request(priority)
+            task = asyncio.ensure_future(fn(request))
+            self.calls[key] = (task, request)
+            task.add_done_callback(lambda _: self.calls.pop(key, None))
+
+        # one caller giving up does not cancel the others
+        return await asyncio.shield(task)
+
+class RiotClient():
+    '''
+    asyncio HTTP client for the Riot API and Data Dragon.
+
+    Keeps one keep-alive connection pool per host. Riot API requests carry the key in the `X-Riot-Token` header and
+    go through the host's :class:`Governor`. Identical requests in flight at the same time share one response.\n
+    With `base_url` (e.g. a local stand-in server) every host is reached through it, the original host is sent as
+    the `Host` header.
+    '''
+    def __init__(self, key: str | None, timeout: aiohttp.ClientTimeout = TIMEOUT, base_url: str = None):
+        self.key = key
+        self.timeout = timeout
+        self.base_url = base_url
+        self.sessions: dict[str, aiohttp.ClientSession] = {}
+        self.governors: dict[str, Governor] = {}
+        self.flights = SingleFlight()
+
+    def session(self, host: str) -> aiohttp.ClientSession:
+        '''
+        Returns the session (connection pool) for a host, creating it on first use.
+        '''
+        if (session := self.sessions.get(host)) and not session.closed:
+            return session
+
+        headers = {'X-Riot-Token': self.key} if self.key and is_api(host) else {}
+        if self.base_url:
+            headers['Host'] = urllib.parse.urlsplit(host).netloc
+
+        connector = aiohttp.TCPConnector(limit=POOL_SIZE, keepalive_timeout=KEEPALIVE, ttl_dns_cache=300)
+
+        session = self.sessions[host] = aiohttp.ClientSession(base_url=self.base_url or host, connector=connector, timeout=self.timeout, headers=headers)
+        return session
+
+    def governor(self, host: str) -> Governor | None:
+        '''
+        Returns the rate-limit governor of a Riot API host, `None` for other hosts.
+        '''
+        if not is_api(host):
+            return None
+
+        if not (governor := self.governors.get(host)):
+            governor = self.governors[host] = Governor()
+        return governor
+
+    async def get(self, host: str, path: str, params: dict = None, method: str = None, priority: int = INTERACTIVE) -> dict | list | None:
+        '''
+        GET a JSON resource.
+
+        `method` names the endpoint's rate limit bucket (default: `path`). Rate limited requests are queued and
+        retried after `Retry-After`.
+
+        Returns
+            the decoded body if the response is 200, otherwise `None`.
+        '''
+        key = (host, path, tuple(sorted((params or {}).items())))
+        return await self.flights.do(key, lambda request: self.fetch(host, path, params, method, request), priority)
+
+    async def fetch(self, host: str, path: str, params: dict = None, method: str = None, request: Request = None) -> dict | list | None:
+        governor = self.governor(host)
+        method = method or path
+        request = request or Request(INTERACTIVE)
+
+        try:
+            for _ in range(RETRIES):
+                if governor:
+                    await governor.acquire(method, request=request)
+
+                async with self.session(host).get(path, params=params) as resp:
+                    if governor:
+                        governor.update(method, resp.headers)
+
+                    if resp.status == 200:
+                        return await resp.json(content_type=None)
+
+                    if resp.status != 429:
+                        return None
+
+                    if governor:
+                        governor.throttle(method, resp.headers)
+                    else:
+                        await asyncio.sleep(to_float(resp.headers.get('Retry-After'), RETRY_AFTER))
+
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            return None
+
+    async def get_bytes(self, host: str, path: str) -> bytes | None:
+        '''
+        GET a binary resource (images).
+
+        Returns
+            the body if the response is 200, otherwise `None`.
+        '''
+        return await self.flights.do((host, path, 'bytes'), lambda request: self.fetch_bytes(host, path))
+
+    async def fetch_bytes(self, host: str, path: str) -> bytes | None:
+        try:
+            async with self.session(host).get(path) as resp:
+                if resp.status == 200:
+                    return await resp.read()
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            return None
+
+    def stats(self) -> dict[str, dict]:
+        '''
+        Returns the governor stats of every Riot API host.
+        '''
+        return {host: governor.stats() for host, governor in self.governors.items()}
+
+    async def close(self):
+        '''
+        Close every connection pool.
+        '''
+        for governor in self.governors.values():
+            if governor.task:
+                governor.task.cancel()
+
+        for session in self.sessions.values():
+            await session.close()
+        self.sessions = {}
+
+def is_api(host: str) -> bool:
+    return host.endswith(".api.riotgames.com")
+
+def parse_limits(limits: str) -> list[tuple[int, int]]:
+    '''
+    Parses a rate limit header (`20:1,100:120`) into a list of (count, window).
+    '''
+    parsed = []
+    for limit in limits.split(","):
+        try:
+            count, window = limit.split(":")
+            parsed.append((int(count), int(window)))
+        except ValueError:
+            continue
+    return parsed
+
+def to_float(string: str | None, default: float) -> float:
+    try:
+        return float(string)
+    except (TypeError, ValueError):
+        return default
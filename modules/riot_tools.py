@@ -1,198 +1,268 @@
 import os
+import asyncio
 from dotenv import load_dotenv
-import difflib
 
-import requests
 import urllib.parse
+from modules.riot_client import RiotClient, INTERACTIVE
+from modules.riot_cache import SWRCache
+from modules.ddragon import DataDragon, DD_URL
+from modules.asset_mirror import AssetMirror
+from modules.match_store import MatchStore
+from modules.match_record import MatchRecord
 
 load_dotenv()
 
 API_KEY = os.getenv("RIOT_KEY")
 
+# optional stand-in for every Riot and Data Dragon host (see bench/riot_stub.py)
+BASE_URL = os.getenv("RIOT_BASE_URL")
+
+# optional directory mirroring Data Dragon profile icons and champion squares
+MIRROR_PATH = os.getenv("DD_MIRROR")
+
+# account-v1 serves every account from any regional cluster
 AMERICA_URL = "https://americas.api.riotgames.com"
-NA_URL = "https://na1.api.riotgames.com"
-DD_URL = "https://ddragon.leagueoflegends.com"
+
+DEFAULT_PLATFORM = "na1"
+
+# platform routing value -> regional routing value
+PLATFORMS = {
+    'na1': "americas", 'br1': "americas", 'la1': "americas", 'la2': "americas",
+    'euw1': "europe", 'eun1': "europe", 'tr1': "europe", 'ru': "europe", 'me1': "europe",
+    'kr': "asia", 'jp1': "asia",
+    'oc1': "sea", 'ph2': "sea", 'sg2': "sea", 'th2': "sea", 'tw2': "sea", 'vn2': "sea",
+}
+
+# default Riot ID tagLines -> platform, used when the account's region cannot be looked up
+TAGLINES = {
+    'na': "na1", 'na1': "na1", 'br': "br1", 'br1': "br1", 'lan': "la1", 'la1': "la1", 'las': "la2", 'la2': "la2",
+    'euw': "euw1", 'euw1': "euw1", 'eune': "eun1", 'eun1': "eun1", 'tr': "tr1", 'tr1': "tr1", 'ru': "ru", 'ru1': "ru", 'me': "me1", 'me1': "me1",
+    'kr': "kr", 'kr1': "kr", 'jp': "jp1", 'jp1': "jp1",
+    'oce': "oc1", 'oc1': "oc1", 'ph': "ph2", 'ph2': "ph2", 'sg': "sg2", 'sg2': "sg2", 'th': "th2", 'th2': "th2", 'tw': "tw2", 'tw2': "tw2", 'vn': "vn2", 'vn2': "vn2",
+}
+
+MATCH_DB_PATH = "json/matches.db"
+
+# (fresh, stale) seconds, stale entries are served while they are refreshed in the background
+ACCOUNT_TTL = (86400, 7 * 86400)
+SUMMONER_TTL = (600, 86400)
+RANKED_TTL = (300, 86400)
+MASTERY_TTL = (1800, 86400)
+
+client = RiotClient(API_KEY, base_url=BASE_URL)
+mirror = AssetMirror(client, DD_URL, MIRROR_PATH) if MIRROR_PATH else None
+dd = DataDragon(client, mirror=mirror)
+matches = MatchStore(MATCH_DB_PATH)
+
+accounts = SWRCache(*ACCOUNT_TTL)
+summoners = SWRCache(*SUMMONER_TTL)
+ranked = SWRCache(*RANKED_TTL)
+masteries = SWRCache(*MASTERY_TTL)
+regions = SWRCache(*ACCOUNT_TTL)
+
+# Routing
+#--------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------#
+
+def platform_url(platform: str) -> str:
+    '''
+    Returns the host of a platform (e.g. `euw1`), each host has its own connection pool and rate limit buckets.
+    '''
+    return f"https://{platform}.api.riotgames.com"
+
+def regional_url(platform: str) -> str:
+    '''
+    Returns the regional host (e.g. `europe`) serving a platform.
+    '''
+    return f"https://{PLATFORMS.get(platform, PLATFORMS[DEFAULT_PLATFORM])}.api.riotgames.com"
+
+def match_platform(matchId: str) -> str:
+    '''
+    Returns the platform of a match ID (e.g. `EUW1_6543210987` -> `euw1`).
+    '''
+    return platform if (platform := matchId.split("_")[0].lower()) in PLATFORMS else DEFAULT_PLATFORM
+
+async def get_platform(puuid: str, tagLine: str = None, priority: int = INTERACTIVE) -> str:
+    '''
+    Returns the platform a player plays League on, guessed from their tagLine if it cannot be looked up.
+    '''
+    path = f"/riot/account/v1/region/by-game/lol/by-puuid/{puuid}"
+
+    if (region := await regions.get(puuid, lambda priority: client.get(AMERICA_URL, path, method="account-v1.getByPuuidAndGame", priority=priority), priority)) \
+            and (platform := str(region.get('region', "")).lower()) in PLATFORMS:
+        return platform
+
+    return TAGLINES.get((tagLine or "").lower(), DEFAULT_PLATFORM)
 
 # Riot API
 #--------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------#
 
-def get_account_by_name(gameName: str, tagLine: str) -> dict | None:
+async def get_account_by_name(gameName: str, tagLine: str, priority: int = INTERACTIVE) -> dict | None:
     '''
     Get Riot account by Riot ID.\n
     Returns: AccountDto
     '''
-    gameName = urllib.parse.quote(gameName)
+    path = f"/riot/account/v1/accounts/by-riot-id/{urllib.parse.quote(gameName)}/{tagLine}"
 
-    url = AMERICA_URL + f"/riot/account/v1/accounts/by-riot-id/{gameName}/{tagLine}"
-    resp = requests.get(url + f"?api_key={API_KEY}")
+    return await accounts.get((gameName.lower(), tagLine.lower()), lambda priority: client.get(AMERICA_URL, path, method="account-v1.getByRiotId", priority=priority), priority)
 
-    if resp.status_code == 200:
-        return resp.json()
-
-def get_account_by_puuid(puuid: str) -> dict | None:
+async def get_account_by_puuid(puuid: str, priority: int = INTERACTIVE) -> dict | None:
     '''
     Get Riot account by puuid.\n
     Returns: AccountDto
     '''
-    url = AMERICA_URL + f"/riot/account/v1/accounts/by-puuid/{puuid}"
-    resp = requests.get(url + f"?api_key={API_KEY}")
+    path = f"/riot/account/v1/accounts/by-puuid/{puuid}"
 
-    if resp.status_code == 200:
-        return resp.json()   
+    return await accounts.get(puuid, lambda priority: client.get(AMERICA_URL, path, method="account-v1.getByPuuid", priority=priority), priority)
 
-def get_summoner_by_name(gameName: str, tagLine: str) -> dict | None:
+async def get_summoner_dto(puuid: str, platform: str = DEFAULT_PLATFORM, priority: int = INTERACTIVE) -> dict | None:
     '''
-    Get summoner by Riot ID.\n
-    Returns: merge(SummonerDTO, AccountDto)
+    Get summoner by puuid.\n
+    Returns: SummonerDTO
     '''
-    if not (account := get_account_by_name(gameName, tagLine)):
-        return None
-    
-    puuid = account['puuid']
+    path = f"/lol/summoner/v4/summoners/by-puuid/{puuid}"
 
-    url = NA_URL + f"/lol/summoner/v4/summoners/by-puuid/{puuid}"
-    resp = requests.get(url + f"?api_key={API_KEY}")
+    return await summoners.get((puuid, platform), lambda priority: client.get(platform_url(platform), path, method="summoner-v4.getByPUUID", priority=priority), priority)
 
-    if resp.status_code == 200:
-        summoner = resp.json()
-        summoner.update(account)
-        return summoner
-    
-def get_summoner_by_puuid(puuid: str) -> dict | None:
+async def get_summoner_by_name(gameName: str, tagLine: str, platform: str = None, priority: int = INTERACTIVE) -> dict | None:
     '''
-    Get summoner by puuid.\n
-    Returns: merge(SummonerDTO, AccountDto)
+    Get summoner by Riot ID, on `platform` (default: the account's region).\n
+    Returns: merge(SummonerDTO, AccountDto, {region})
     '''
-    if not (account := get_account_by_puuid(puuid)):
+    if not (account := await get_account_by_name(gameName, tagLine, priority)):
         return None
 
-    url = NA_URL + f"/lol/summoner/v4/summoners/by-puuid/{puuid}"
-    resp = requests.get(url + f"?api_key={API_KEY}")
+    platform = platform or await get_platform(account['puuid'], tagLine, priority)
+
+    if summoner := await get_summoner_dto(account['puuid'], platform, priority):
+        return summoner | account | {'region': platform}
+    
+async def get_summoner_by_puuid(puuid: str, platform: str = None, priority: int = INTERACTIVE) -> dict | None:
+    '''
+    Get summoner by puuid, on `platform` (default: the account's region).\n
+    Returns: merge(SummonerDTO, AccountDto, {region})
+    '''
+    if not platform:
+        account, platform = await asyncio.gather(get_account_by_puuid(puuid, priority), get_platform(puuid, priority=priority))
+        summoner = await get_summoner_dto(puuid, platform, priority)
+    else:
+        account, summoner = await asyncio.gather(get_account_by_puuid(puuid, priority), get_summoner_dto(puuid, platform, priority))
 
-    if resp.status_code == 200:
-        summoner = resp.json()
-        summoner.update(account)
-        return summoner
+    if account and summoner:
+        return summoner | account | {'region': platform}
 
-def get_stats_by_summoner(summonerId: str) -> list[dict] | None:
+async def get_stats_by_summoner(summonerId: str, platform: str = DEFAULT_PLATFORM, priority: int = INTERACTIVE, fresh: bool = False) -> list[dict] | None:
     '''
-    Get summoner stats.\n
+    Get summoner stats (`fresh`: never serve a stale cache entry).\n
     Returns: list[LeagueEntryDTO]
     '''
-    url = NA_URL + f"/lol/league/v4/entries/by-summoner/{summonerId}"
-    resp = requests.get(url + f"?api_key={API_KEY}")
+    path = f"/lol/league/v4/entries/by-summoner/{summonerId}"
 
-    if resp.status_code == 200:
-        return resp.json()
+    return await ranked.get(summonerId, lambda priority: client.get(platform_url(platform), path, method="league-v4.getLeagueEntriesForSummoner", priority=priority), priority, fresh)
     
-def get_matchId_by_puuid(puuid: str, count: int = 20) -> list | None:
+async def get_matchId_by_puuid(puuid: str, count: int = 20, start_time: int = None, platform: str = DEFAULT_PLATFORM, priority: int = INTERACTIVE) -> list | None:
     '''
-    Get match IDs.\n
+    Get match IDs, newest first, optionally only matches started at or after `start_time` (epoch seconds).\n
     Returns: list[str]
     '''
-    url = AMERICA_URL + f"/lol/match/v5/matches/by-puuid/{puuid}/ids?start=0&count={count}"
-    resp = requests.get(url + f"&api_key={API_KEY}")
+    params = {'start': 0, 'count': count}
+    if start_time != None:
+        params['startTime'] = start_time
 
-    if resp.status_code == 200:
-        return resp.json()
+    return await client.get(regional_url(platform), f"/lol/match/v5/matches/by-puuid/{puuid}/ids", params, method="match-v5.getMatchIdsByPUUID", priority=priority)
     
-def get_match_by_id(matchId: str) -> dict | None:
+async def get_match_by_id(matchId: str, priority: int = INTERACTIVE) -> MatchRecord | None:
     '''
-    Get match info by match ID.\n
-    Returns: MatchDto
+    Get match info by match ID (routed by its platform prefix).\n
+    Returns: MatchRecord (projection of MatchDto)
     '''
-    url = AMERICA_URL + f"/lol/match/v5/matches/{matchId}"
-    resp = requests.get(url + f"?api_key={API_KEY}")
+    if match := matches.get(matchId):
+        return match
 
-    if resp.status_code == 200:
-        return resp.json()
+    if match := await client.get(regional_url(match_platform(matchId)), f"/lol/match/v5/matches/{matchId}", method="match-v5.getMatch", priority=priority):
+        match = MatchRecord.from_dto(match)
+        matches.put(matchId, match)
+        return match
     
-def get_champion_masteries_by_puuid(puuid: str, count = 3) -> list[dict] | None:
+async def get_champion_masteries_by_puuid(puuid: str, count = 3, platform: str = DEFAULT_PLATFORM, priority: int = INTERACTIVE) -> list[dict] | None:
     '''
     Get top champion masteries for a summoner by puuid.
     '''
-    url = NA_URL + f"/lol/champion-mastery/v4/champion-masteries/by-puuid/{puuid}/top?count=3"
-    resp = requests.get(url + f"&api_key={API_KEY}")
+    path = f"/lol/champion-mastery/v4/champion-masteries/by-puuid/{puuid}/top"
 
-    if resp.status_code == 200:
-        return resp.json()
+    return await masteries.get((puuid, count, platform), lambda priority: client.get(platform_url(platform), path, {'count': count}, method="champion-mastery-v4.getTopChampionMasteriesByPUUID", priority=priority), priority)
 
 # Data Dragon
 #--------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------#
 
-def get_dd_version() -> str | None:
+async def get_dd_version() -> str | None:
     '''
     Returns the latest Data Dragon version.
     '''
-    resp = requests.get(DD_URL + "/api/versions.json")
-
-    if resp.status_code == 200:
-        return resp.json()[0]
+    return await dd.get_version()
 
-def get_summoner_icon(iconId: int | str) -> str | None:
+async def get_summoner_icon(iconId: int | str) -> str | None:
     '''
     Returns summoner icon link.
     '''
-    if not (version := get_dd_version()):
+    if not (version := await dd.get_version()):
         return
     
     return DD_URL + f"/cdn/{version}/img/profileicon/{iconId}.png"
 
-def get_champions() -> dict | None:
+async def get_champions() -> dict | None:
     '''
     Get champions.
     '''
-    if not (version := get_dd_version()):
-        return
+    return await dd.get_champions()
     
-    url = DD_URL + f"/cdn/{version}/data/en_US/champion.json"
-    resp = requests.get(url)
-
-    if resp.status_code == 200:
-        return resp.json()['data']
-    
-def get_champion_by_id(championId: int | str) -> dict | None:
+async def get_champion_by_id(championId: int | str) -> dict | None:
     '''
     Get champion by ID.
     '''
-    if not (version := get_dd_version()):
-        return
-
-    if not (champions := get_champions()):
+    if not (championName := await dd.get_champion_id(championId)):
         return
     
-    if not (championName := [champion['id'] for champion in champions.values() if champion['key'] == str(championId)]):
-        return
+    return await dd.get_champion(championName)
     
-    url = DD_URL + f"/cdn/{version}/data/en_US/champion/{championName[0]}.json"
-    resp = requests.get(url)
-
-    if resp.status_code == 200:
-        return resp.json()['data'][championName[0]]
-    
-def get_champion_by_name(championName: str) -> dict | None:
+async def get_champion_by_name(championName: str) -> dict | None:
     '''
     Get champion by name.
     '''
-    if not (version := get_dd_version()):
-        return
-
-    if not (champions := get_champions()):
+    if not (championName := await dd.search_champions(championName, 1)):
         return
     
-    if not (championName := difflib.get_close_matches(championName, champions.keys(), 1)):
-        return
+    return await dd.get_champion(championName[0])
     
-    url = DD_URL + f"/cdn/{version}/data/en_US/champion/{championName[0]}.json"
-    resp = requests.get(url)
+async def search_champions(query: str, limit: int = 25) -> list[str]:
+    '''
+    Search champions by name, id or alias.\n
+    Returns: list of champion ids, best match first
+    '''
+    return await dd.search_champions(query, limit)
 
-    if resp.status_code == 200:
-        return resp.json()['data'][championName[0]]
-    
-def get_champion_skins_by_name(championName: str) -> list[dict]:
+async def get_champion_skins_by_name(championName: str) -> list[dict]:
     '''
     Get champion skins by name.
     '''
-    if champion := get_champion_by_name(championName):
-        [skin.update({'url' : DD_URL + f"/cdn/img/champion/splash/{champion['id']}_{skin['num']}.jpg"}) for skin in champion['skins']]
-        return champion['skins']
+    if champion := await get_champion_by_name(championName):
+        # new dicts, the champion is shared through the Data Dragon cache
+        return [skin | {'url' : DD_URL + f"/cdn/img/champion/splash/{champion['id']}_{skin['num']}.jpg"} for skin in champion['skins']]
+
+async def get_image(url: str) -> bytes | memoryview | None:
+    '''
+    Download a Data Dragon image.
+    '''
+    return await dd.get_image(url.removeprefix(DD_URL))
+
+def get_local_image(url: str) -> memoryview | None:
+    '''
+    Returns a Data Dragon image from the asset mirror, `None` if it is not mirrored.
+    '''
+    if mirror and mirror.mirrors(path := url.removeprefix(DD_URL)):
+        return mirror.get(path)
+
+def prefetch_images(urls: list[str]):
+    '''
+    Download Data Dragon images into the cache in the background.
+    '''
+    dd.prefetch_images([url.removeprefix(DD_URL) for url in urls])